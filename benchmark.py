@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Offline Benchmark Harness
+Runs the compiled graphs from simple_langgraph_app.py, langgraph_app.py and
+langgraph_mcp_client.py against a scripted chat model and stub tool backends, and reports
+per-node and per-tool latency percentiles, throughput and memory as JSON
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import importlib
+import threading
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Graphs replaying a cassette still build a ChatOpenAI client, it is never called here
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import cassette
+import stub_backends
+from deadlines import deadline_scope, TURN_TIMEOUT
+from graph_factory import graphs
+
+# Graph name -> (module, tool name for each intent)
+GRAPHS = {
+    "simple": ("simple_langgraph_app", {"search": "search_web", "dice": "roll_dice_tool", "stock": "get_stock_info"}),
+    "subprocess": ("langgraph_app", {"search": "web_search", "dice": "roll_dice", "stock": "get_stock_data"}),
+    "mcp_client": ("langgraph_mcp_client", {"search": "web_search", "dice": "roll_dice", "stock": "get_stock_data"}),
+}
+
+# The same query mix as demo_langgraph.py, with the tool calls the model should make per step
+SCENARIOS = [
+    {
+        "input": "Roll 3d6 for my character's strength check",
+        "steps": [[("dice", {"notation": "3d6"})]],
+    },
+    {
+        "input": "What's the current stock price and market data for TSLA?",
+        "steps": [[("stock", {"symbol": "TSLA"})]],
+    },
+    {
+        "input": "Search for the latest news about artificial intelligence and machine learning",
+        "steps": [[("search", {"query": "latest news artificial intelligence machine learning"})]],
+    },
+    {
+        "input": "Search for information about Apple Inc and then get their current stock price",
+        "steps": [[("search", {"query": "Apple Inc"})], [("stock", {"symbol": "AAPL"})]],
+    },
+]
+
+# Command that starts server.py on the stub backends
+STUB_SERVER_COMMAND = [sys.executable, "-m", "stub_backends", "server.py"]
+
+
+class ScriptedChatModel:
+    """Stands in for the tool-bound ChatOpenAI client, replaying the tool calls of each scenario"""
+
+    def __init__(self, tool_names: dict, latency: float = 0.2):
+        self.tool_names = tool_names
+        self.latency = latency
+        self._scripts = {scenario["input"]: scenario["steps"] for scenario in SCENARIOS}
+        self._ids = iter(range(10**9))
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, timeout=None, **kwargs) -> AIMessage:
+        time.sleep(self.latency if timeout is None else min(self.latency, timeout))
+
+        user_input = next(m.content for m in messages if isinstance(m, HumanMessage))
+        steps = self._scripts.get(user_input, [])
+        step = sum(isinstance(m, AIMessage) for m in messages)
+        if step >= len(steps):
+            return AIMessage(content=f"Scripted answer for: {user_input}")
+
+        with self._lock:
+            tool_calls = [
+                {"name": self.tool_names[intent], "args": args, "id": f"call_{next(self._ids)}"}
+                for intent, args in steps[step]
+            ]
+        return AIMessage(content="", tool_calls=tool_calls)
+
+
+class LatencyRecorder(BaseCallbackHandler):
+    """Callback handler that times every graph node and tool run"""
+
+    run_inline = True
+
+    def __init__(self):
+        self.nodes = defaultdict(list)
+        self.tools = defaultdict(list)
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Skip LangGraph's own bookkeeping nodes like __start__
+        if node is not None and kwargs.get("name") == node and not node.startswith("__"):
+            self._started[run_id] = (self.nodes[node], time.perf_counter())
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        self._started[run_id] = (self.tools[name], time.perf_counter())
+
+    def _finish(self, run_id):
+        entry = self._started.pop(run_id, None)
+        if entry is not None:
+            samples, started = entry
+            with self._lock:
+                samples.append(time.perf_counter() - started)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of the samples, 0.0 when there are none"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples) -> dict:
+    """Latency summary in milliseconds"""
+    return {
+        "count": len(samples),
+        "mean_ms": round(1000 * sum(samples) / len(samples), 3) if samples else 0.0,
+        "p50_ms": round(1000 * percentile(samples, 50), 3),
+        "p95_ms": round(1000 * percentile(samples, 95), 3),
+        "p99_ms": round(1000 * percentile(samples, 99), 3),
+    }
+
+
+def rss_mb(pid: int):
+    """Resident set size of a process in MB, None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids() -> list:
+    """PIDs of our direct child processes, which are the stdio servers"""
+    pids = []
+    if not os.path.isdir("/proc"):
+        return pids
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, the parent PID follows the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == os.getpid():
+            pids.append(int(entry))
+    return pids
+
+
+class MemorySampler:
+    """Samples the current RSS of this process and of its MCP server subprocesses during one run
+
+    ru_maxrss would only give the high-water mark of the whole benchmark and leave the
+    servers out, so runs could not be compared.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.start_rss = None
+        self.peak_rss = None
+        self.peak_server_rss = None
+        self.peak_servers = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def __enter__(self):
+        self.start_rss = rss_mb(os.getpid())
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.sample()
+            if self._stop.wait(self.interval):
+                return
+
+    def sample(self):
+        own = rss_mb(os.getpid())
+        if own is not None:
+            self.peak_rss = max(self.peak_rss or 0.0, own)
+        servers = [rss for rss in map(rss_mb, child_pids()) if rss is not None]
+        if servers:
+            self.peak_server_rss = max(self.peak_server_rss or 0.0, sum(servers))
+            self.peak_servers = max(self.peak_servers, len(servers))
+
+    def report(self) -> dict:
+        """Peaks of this run in MB, None where /proc is not available"""
+        rounded = lambda mb: round(mb, 1) if mb is not None else None
+        return {
+            "peak_rss_mb": rounded(self.peak_rss),
+            "rss_growth_mb": rounded(self.peak_rss - self.start_rss) if self.peak_rss is not None else None,
+            "peak_server_rss_mb": rounded(self.peak_server_rss),
+            "peak_servers": self.peak_servers,
+        }
+
+
+def recorded_inputs(replay: cassette.Cassette) -> list:
+    """The user inputs that started each recorded conversation in a cassette"""
+    inputs = []
+    for key in replay.keys("openai.chat"):
+        user_inputs, step = json.loads(key)
+        if step == 0 and user_inputs and user_inputs[-1] not in inputs:
+            inputs.append(user_inputs[-1])
+    return inputs
+
+
+def load_graph(name: str, llm_latency: float, replay: bool = False):
+    """Build a graph on the scripted model and point its module at the stub backends
+
+    On replay the graph keeps its own model, whose calls are answered from the cassette.
+    """
+    module_name, tool_names = GRAPHS[name]
+    module = importlib.import_module(module_name)
+
+    if name == "subprocess":
+        module.SERVER_COMMAND = STUB_SERVER_COMMAND
+    elif name == "mcp_client":
+        # The server only inherits a minimal environment by default, pass the stub latencies on
+        module.server_params = module.StdioServerParameters(
+            command=STUB_SERVER_COMMAND[0], args=STUB_SERVER_COMMAND[1:], env=dict(os.environ)
+        )
+
+    if replay:
+        return module.get_app()
+    return module.get_app(llm_with_tools=ScriptedChatModel(tool_names, latency=llm_latency))
+
+
+def run_turn(app, user_input: str, recorder: LatencyRecorder) -> float:
+    started = time.perf_counter()
+    with deadline_scope(TURN_TIMEOUT):
+        app.invoke({"messages": [HumanMessage(content=user_input)]}, config={"callbacks": [recorder]})
+    return time.perf_counter() - started
+
+
+async def arun_turn(app, user_input: str, recorder: LatencyRecorder) -> float:
+    started = time.perf_counter()
+    with deadline_scope(TURN_TIMEOUT):
+        await app.ainvoke({"messages": [HumanMessage(content=user_input)]}, config={"callbacks": [recorder]})
+    return time.perf_counter() - started
+
+
+def run_sessions(app, is_async: bool, inputs: list, sessions: int, recorder: LatencyRecorder):
+    """Run the inputs with at most `sessions` turns in flight, returning turn latencies and errors"""
+    turns, errors = [], []
+
+    if is_async:
+        async def main():
+            limit = asyncio.Semaphore(sessions)
+
+            async def session(user_input):
+                async with limit:
+                    try:
+                        turns.append(await arun_turn(app, user_input, recorder))
+                    except Exception as e:
+                        errors.append(f"{type(e).__name__}: {e}")
+
+            await asyncio.gather(*(session(user_input) for user_input in inputs))
+
+        asyncio.run(main())
+        return turns, errors
+
+    def session(user_input):
+        try:
+            turns.append(run_turn(app, user_input, recorder))
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(session, inputs))
+    return turns, errors
+
+
+def benchmark_graph(name: str, sessions: int, requests: int, llm_latency: float, trace_memory: bool = False,
+                    replay_inputs: list = None) -> dict:
+    """Benchmark one graph at one concurrency level, on the scenarios or on replayed inputs"""
+    app = load_graph(name, llm_latency, replay=replay_inputs is not None)
+    is_async = name == "mcp_client"
+    pool = replay_inputs or [scenario["input"] for scenario in SCENARIOS]
+    inputs = [pool[i % len(pool)] for i in range(requests)]
+
+    # Warm up imports and connections outside of the measurement
+    run_sessions(app, is_async, pool[:1], 1, LatencyRecorder())
+
+    recorder = LatencyRecorder()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with MemorySampler() as sampler:
+        turns, errors = run_sessions(app, is_async, inputs, sessions, recorder)
+    wall_time = time.perf_counter() - started
+    memory = sampler.report()
+    if trace_memory:
+        memory["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.stop()
+
+    return {
+        "graph": name,
+        "sessions": sessions,
+        "requests": requests,
+        "completed": len(turns),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(turns) / wall_time, 3) if wall_time else 0.0,
+        "turn": summarize(turns),
+        "nodes": {node: summarize(samples) for node, samples in sorted(recorder.nodes.items())},
+        "tools": {tool: summarize(samples) for tool, samples in sorted(recorder.tools.items())},
+        "memory": memory,
+        # How long building and compiling this graph took, per stage
+        "construction_ms": graphs.build_times(name)[-1]["stages_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the LangGraph MCP agents")
+    parser.add_argument("--graph", action="append", choices=[*GRAPHS, "all"],
+                        help="Graph to benchmark, can be repeated (default: simple)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrent session counts to run")
+    parser.add_argument("--requests", type=int, default=40, help="Turns per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per scripted LLM call")
+    parser.add_argument("--search-latency", type=float, default=stub_backends.SEARCH_LATENCY,
+                        help="Seconds per stubbed web search")
+    parser.add_argument("--stock-latency", type=float, default=stub_backends.STOCK_LATENCY,
+                        help="Seconds per stubbed Yahoo Finance lookup")
+    parser.add_argument("--cassette",
+                        help="Replay the traffic recorded in this cassette instead of the scripted scenarios")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Replay recorded upstream latencies scaled by this factor (0 = no delay)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report the tracemalloc peak, this slows the run down")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    graphs = args.graph or ["simple"]
+    if "all" in graphs:
+        graphs = list(GRAPHS)
+
+    # Server subprocesses read the stub latencies and cassette settings from the environment
+    os.environ["STUB_SEARCH_LATENCY"] = str(args.search_latency)
+    os.environ["STUB_STOCK_LATENCY"] = str(args.stock_latency)
+    stub_backends.install(args.search_latency, args.stock_latency)
+
+    replay_inputs = None
+    if args.cassette:
+        os.environ["CASSETTE_MODE"] = "replay"
+        os.environ["CASSETTE_PATH"] = args.cassette
+        os.environ["CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+        replay_inputs = recorded_inputs(cassette.configure("replay", args.cassette, args.latency_scale))
+        if not replay_inputs:
+            parser.error(f"No recorded conversations in {args.cassette}")
+
+    results = []
+    for graph in graphs:
+        for sessions in args.sessions:
+            result = benchmark_graph(graph, sessions, args.requests, args.llm_latency, args.trace_memory,
+                                     replay_inputs)
+            results.append(result)
+            print(f"{graph:>10} sessions={sessions:<3} {result['throughput_rps']:>8.2f} turns/s  "
+                  f"p50={result['turn']['p50_ms']:.0f}ms p95={result['turn']['p95_ms']:.0f}ms  "
+                  f"errors={result['errors']}", file=sys.stderr)
+
+    report = {
+        "config": {
+            "llm_latency_s": args.llm_latency,
+            "search_latency_s": args.search_latency,
+            "stock_latency_s": args.stock_latency,
+            "requests": args.requests,
+            "cassette": args.cassette,
+            "latency_scale": args.latency_scale if args.cassette else None,
+            "python": sys.version.split()[0],
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
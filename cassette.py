@@ -0,0 +1,154 @@
+"""
+Record/Replay for Upstream APIs
+This module captures Tavily, Yahoo Finance and OpenAI responses with their timing to a cassette
+file, and replays them deterministically at the original or a scaled latency
+"""
+
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from deadlines import DeadlineExceeded
+from metrics import record_upstream
+
+# off, record or replay
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/upstream.jsonl")
+# 1.0 replays at the recorded latency, 0 as fast as possible
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+class RecordedError(RuntimeError):
+    """An upstream error captured while recording, raised again on replay"""
+
+
+class Cassette:
+    """Append-only JSON lines file of upstream requests, their responses and how long they took"""
+
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = CASSETTE_MODE, latency_scale: float = CASSETTE_LATENCY_SCALE):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._entries = None
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, service: str, key: str, fn, *args, encode=None, decode=None, **kwargs):
+        """Run an upstream call through the cassette
+
+        service and key identify the request, encode/decode convert the response to and from
+        JSON when it is not JSON already. A `timeout` keyword is honoured on replay.
+        """
+        if self.mode == "replay":
+            return self._replay(service, key, kwargs.get("timeout"), decode)
+        if self.mode == "off":
+            return fn(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            response = fn(*args, **kwargs)
+        except Exception as e:
+            self._append({"service": service, "key": key, "elapsed": time.perf_counter() - started,
+                          "error": f"{type(e).__name__}: {e}"})
+            raise
+        self._append({"service": service, "key": key, "elapsed": time.perf_counter() - started,
+                      "response": encode(response) if encode else response})
+        return response
+
+    def keys(self, service: str) -> list:
+        """Recorded request keys for a service, in recording order"""
+        return [key for (recorded, key) in self._load() if recorded == service]
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # One write per line so server subprocesses can append to the same file
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def _load(self) -> dict:
+        with self._lock:
+            if self._entries is None:
+                entries = defaultdict(list)
+                with open(self.path) as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[(entry["service"], entry["key"])].append(entry)
+                self._entries = entries
+            return self._entries
+
+    def _replay(self, service: str, key: str, timeout, decode):
+        recorded = self._load().get((service, key))
+        if not recorded:
+            raise CassetteMiss(f"No recorded {service} response for {key!r} in {self.path}")
+
+        # Identical requests replay in recording order, the last one repeats once they run out
+        with self._lock:
+            position = self._positions[(service, key)]
+            self._positions[(service, key)] += 1
+        entry = recorded[min(position, len(recorded) - 1)]
+
+        delay = entry["elapsed"] * self.latency_scale
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise DeadlineExceeded(f"Replayed {service} call took longer than {timeout:.1f} seconds")
+        time.sleep(delay)
+
+        if "error" in entry:
+            raise RecordedError(entry["error"])
+        return decode(entry["response"]) if decode else entry["response"]
+
+
+cassette = Cassette()
+
+if cassette.mode == "replay":
+    # Clients are still constructed on replay but never talk to the real services
+    os.environ.setdefault("OPENAI_API_KEY", "cassette-replay")
+    os.environ.setdefault("TAVILY_API_KEY", "cassette-replay")
+
+
+def configure(mode: str, path: str = CASSETTE_PATH, latency_scale: float = CASSETTE_LATENCY_SCALE):
+    """Switch the shared cassette, e.g. from a benchmark run"""
+    global cassette
+    cassette = Cassette(path, mode, latency_scale)
+    return cassette
+
+
+def upstream(service: str, key: str, fn, *args, **kwargs):
+    """Call an upstream API through the shared cassette, recording its metrics"""
+    return record_upstream(service, cassette.call, service, key, fn, *args, **kwargs)
+
+
+def chat_key(messages) -> str:
+    """Key a chat request by the user input and how many model turns came before it
+
+    Tool results (dice rolls, live prices) and message ids differ between runs, so they are
+    left out to keep replays matching.
+    """
+    user_inputs = [m.content for m in messages if m.type == "human"]
+    step = sum(m.type == "ai" for m in messages)
+    return json.dumps([user_inputs, step])
+
+
+class ReplayableChatModel:
+    """Wraps a (tool-bound) chat model so its calls go through the cassette"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import message_to_dict, messages_from_dict
+
+        return upstream(
+            "openai.chat", chat_key(messages), self.model.invoke, messages,
+            encode=message_to_dict, decode=lambda data: messages_from_dict([data])[0], **kwargs
+        )
@@ -0,0 +1,201 @@
+"""
+Deadline Propagation
+This module carries a per-turn deadline from run_agent through ToolNode into each tool and
+its upstream call, and provides hedged requests for idempotent reads
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from profiling import run_tracked
+
+# Budgets in seconds, overridable from the .env file
+TURN_TIMEOUT = float(os.getenv("TURN_TIMEOUT", "60"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+
+# Fire a second attempt for idempotent reads once the first one is slower than the p95
+ENABLE_HEDGING = os.getenv("ENABLE_HEDGING", "false").lower() in ("1", "true", "yes")
+# Worker threads per upstream, an attempt abandoned at the deadline holds its worker until it returns
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "8"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the deadline of the current turn has expired or the turn was abandoned"""
+
+
+class Deadline:
+    """A point in time by which the current turn has to finish"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self._cancelled.is_set() or self.remaining() <= 0
+
+    def cancel(self):
+        """Abandon the turn, in-flight tools see the deadline as expired"""
+        self._cancelled.set()
+
+    def check(self):
+        """Raise DeadlineExceeded if there is no time left"""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded("Turn was cancelled")
+        if self.remaining() <= 0:
+            raise DeadlineExceeded("Turn deadline exceeded")
+
+
+_current_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float = TURN_TIMEOUT):
+    """Run the enclosed block under a deadline, nested scopes never extend an outer one"""
+    outer = _current_deadline.get()
+    if outer is not None:
+        seconds = min(seconds, outer.remaining())
+    deadline = Deadline(seconds)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        # Anything still running for this turn is abandoned
+        deadline.cancel()
+        _current_deadline.reset(token)
+
+
+def current_deadline():
+    """Return the deadline of the current turn, or None outside of a deadline scope"""
+    return _current_deadline.get()
+
+
+def time_left(cap: float = TOOL_TIMEOUT) -> float:
+    """Timeout to hand to the next upstream call, capped by the remaining turn budget"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    deadline.check()
+    return min(cap, deadline.remaining())
+
+
+class LatencyTracker:
+    """Keeps recent latencies per tool to decide when a request is worth hedging"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def p95(self, name: str):
+        """The 95th percentile latency, or None until there are enough samples"""
+        with self._lock:
+            samples = sorted(self._samples[name])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+latency = LatencyTracker()
+
+
+class AttemptPools:
+    """A bounded thread pool per upstream, so calls hung on one upstream cannot starve the others
+
+    Python threads cannot be interrupted, an abandoned attempt keeps running on its worker until
+    the upstream returns. Once every worker of a pool is held like that, new attempts for that
+    upstream queue up and run out of time, while other upstreams are not affected.
+    """
+
+    def __init__(self, max_workers: int = HEDGE_WORKERS):
+        self.max_workers = max_workers
+        self._pools = {}
+        self._abandoned = Counter()
+        self._running = Counter()
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Run fn on the pool of upstream `name`, calls without a name share the default pool"""
+        key = name or "default"
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                prefix = "deadline" if name is None else f"deadline_{name}"
+                pool = self._pools[key] = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=prefix)
+        # Each attempt gets its own copy of the context so it sees the turn deadline, and the profiler
+        context = contextvars.copy_context()
+        return pool.submit(context.run, run_tracked, fn, *args, **kwargs)
+
+    def abandon(self, name, attempt):
+        """Stop waiting for an attempt, counting it while it still holds a worker"""
+        if attempt.cancel() or attempt.done():
+            return
+        key = name or "default"
+        with self._lock:
+            self._abandoned[key] += 1
+            self._running[key] += 1
+        attempt.add_done_callback(lambda _: self._finished(key))
+
+    def _finished(self, key):
+        with self._lock:
+            self._running[key] -= 1
+
+    def stats(self) -> list:
+        """(name, workers, abandoned, abandoned_running) per pool, the last are still holding workers"""
+        with self._lock:
+            return [(key, self.max_workers, self._abandoned[key], self._running[key]) for key in sorted(self._pools)]
+
+
+attempt_pools = AttemptPools()
+
+
+def call_with_deadline(fn, *args, timeout: float = TOOL_TIMEOUT, **kwargs):
+    """Run a blocking call that has no timeout of its own and give up when the budget runs out"""
+    return hedged_call(None, fn, *args, timeout=timeout, hedge=False, **kwargs)
+
+
+def hedged_call(name, fn, *args, timeout: float = TOOL_TIMEOUT, hedge: bool = ENABLE_HEDGING, hedge_after=None, **kwargs):
+    """Run an idempotent call, firing a second attempt if the first is slower than the p95"""
+    limit = time_left(timeout)
+    started = time.monotonic()
+    attempts = [attempt_pools.submit(name, fn, *args, **kwargs)]
+
+    if hedge and name is not None:
+        delay = hedge_after if hedge_after is not None else latency.p95(name)
+        if delay is not None and delay < limit:
+            done, _ = wait(attempts, timeout=delay)
+            if not done:
+                attempts.append(attempt_pools.submit(name, fn, *args, **kwargs))
+
+    pending = set(attempts)
+    error = None
+    while pending:
+        remaining = limit - (time.monotonic() - started)
+        done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for attempt in done:
+            if attempt.exception() is None:
+                for other in pending:
+                    attempt_pools.abandon(name, other)
+                if name is not None:
+                    latency.record(name, time.monotonic() - started)
+                return attempt.result()
+            error = attempt.exception()
+
+    if error is not None and not pending:
+        raise error
+    for attempt in pending:
+        attempt_pools.abandon(name, attempt)
+    raise DeadlineExceeded(f"Call did not finish within {limit:.1f} seconds")
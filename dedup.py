@@ -0,0 +1,152 @@
+"""
+Tool Call Deduplication
+This module merges identical (tool, arguments) invocations that are in flight into one
+execution and fans the result out to every caller, within a turn and across sessions
+"""
+
+import json
+import asyncio
+import inspect
+import functools
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from deadlines import DeadlineExceeded, current_deadline, time_left
+
+
+def call_key(name: str, *args, **kwargs) -> str:
+    """Key identifying a tool call by its name and arguments"""
+    return json.dumps([name, args, kwargs], sort_keys=True, default=str)
+
+
+def _key_name(key) -> str:
+    # Keys from call_key start with the tool name
+    try:
+        return json.loads(key)[0]
+    except (TypeError, ValueError, IndexError, KeyError):
+        return str(key)
+
+
+def _leader_ran_out_of_time(error) -> bool:
+    # The leader's turn expired but ours has not, so we should run the call ourselves
+    deadline = current_deadline()
+    return isinstance(error, DeadlineExceeded) and (deadline is None or not deadline.expired())
+
+
+class SingleFlight:
+    """Runs at most one execution per key at a time, later callers share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self._executed = Counter()
+        self._shared = Counter()
+
+    def stats(self) -> list:
+        """(name, executed, shared) per tool, shared calls got the result of one already in flight"""
+        with self._lock:
+            names = sorted(set(self._executed) | set(self._shared))
+            return [(name, self._executed[name], self._shared[name]) for name in names]
+
+    def _count(self, key, leader: bool):
+        with self._lock:
+            (self._executed if leader else self._shared)[_key_name(key)] += 1
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn, or wait for the identical call that is already in flight"""
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._calls[key] = future
+            self._count(key, leader)
+
+            if leader:
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+
+            try:
+                return future.result(timeout=time_left())
+            except Exception as e:
+                # Our own wait timed out, as opposed to the leader failing
+                if not future.done():
+                    raise DeadlineExceeded("Deduplicated call did not finish in time") from e
+                if not _leader_ran_out_of_time(e):
+                    raise
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """Async variant of do for coroutine functions, merged within the running event loop"""
+        while True:
+            future = self._async_calls.get(key)
+            self._count(key, future is None)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                # Nobody may be waiting on the failure, don't warn about it
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._async_calls[key] = future
+                try:
+                    result = await fn(*args, **kwargs)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    del self._async_calls[key]
+
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=time_left())
+            except asyncio.CancelledError:
+                # Only the leader was cancelled, take over the call
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            except Exception as e:
+                # Our own wait timed out, as opposed to the leader failing
+                if not future.done():
+                    raise DeadlineExceeded("Deduplicated call did not finish in time") from e
+                if not _leader_ran_out_of_time(e):
+                    raise
+
+
+# Shared by every session in this process
+tool_calls = SingleFlight()
+
+
+def deduplicate(fn=None, *, name: str = None):
+    """Merge concurrent calls of fn with identical arguments into one execution
+
+    Only use this for idempotent reads, never for calls like roll_dice where every
+    invocation is meant to produce a fresh result. Wrap the part that raises on failure,
+    so a follower can take over when the leader's turn runs out of time. `name` keys the
+    calls and their stats under a tool name other than the function's.
+    """
+    if fn is None:
+        return functools.partial(deduplicate, name=name)
+    name = name or fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            return await tool_calls.ado(call_key(name, *args, **kwargs), fn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return tool_calls.do(call_key(name, *args, **kwargs), fn, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,117 @@
+"""
+Graph Factory
+Builds and compiles the agent graphs on first use, caches them per configuration, and shares
+one chat model and its pooled HTTP client across all graphs and sessions
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Connections kept open to the OpenAI API, shared by every graph in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+_lock = threading.Lock()
+_http_client = None
+_chat_models = {}
+
+
+def http_client():
+    """The pooled HTTP client every chat model in this process talks to OpenAI through"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            from openai import DefaultHttpxClient
+            import httpx
+
+            _http_client = DefaultHttpxClient(limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS
+            ))
+        return _http_client
+
+
+def chat_model(model: str = "gpt-4o-mini", temperature: float = 0):
+    """Shared ChatOpenAI client for a model and temperature, created on first use"""
+    key = (model, temperature)
+    client = http_client()
+    with _lock:
+        if key not in _chat_models:
+            # langchain_openai pulls in the OpenAI SDK, which is slow to import
+            from langchain_openai import ChatOpenAI
+
+            _chat_models[key] = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=client,
+            )
+        return _chat_models[key]
+
+
+def _describe(value):
+    # Models passed in to build are reported by type, not by address
+    return value if isinstance(value, (bool, int, float, str, type(None))) else type(value).__name__
+
+
+class GraphFactory:
+    """Compiled graphs cached per name and configuration, with how long each stage took to build"""
+
+    def __init__(self, history: int = 100):
+        self._graphs = {}
+        self._build_times = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def get(self, name: str, builder, **config):
+        """The graph `name` for this configuration, calling builder(stage, **config) on first use
+
+        The configuration values must be hashable, like flags and model names. Graphs built
+        around objects supplied per call, such as a replacement model, go through `build`.
+        """
+        key = (name, tuple(sorted(config.items())))
+        graph = self._graphs.get(key)
+        if graph is not None:
+            return graph
+
+        with self._lock:
+            if key not in self._graphs:
+                self._graphs[key] = self.build(name, builder, **config)
+            return self._graphs[key]
+
+    def build(self, name: str, builder, **config):
+        """Build a graph without caching it, recording its stage timings
+
+        builder wraps each construction step in `with stage("label"):` to have it timed.
+        """
+        stages = {}
+
+        @contextmanager
+        def stage(label: str):
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                stages[label] = round((time.perf_counter() - started) * 1000, 3)
+
+        started = time.perf_counter()
+        graph = builder(stage, **config)
+        stages["total"] = round((time.perf_counter() - started) * 1000, 3)
+        self._build_times.append({
+            "graph": name,
+            "config": {key: _describe(value) for key, value in sorted(config.items())},
+            "stages_ms": stages,
+        })
+        return graph
+
+    def build_times(self, name: str = None) -> list:
+        """Construction time of each stage in ms for the most recent builds, oldest first"""
+        return [entry for entry in self._build_times if name is None or entry["graph"] == name]
+
+    def clear(self):
+        with self._lock:
+            self._graphs.clear()
+            self._build_times.clear()
+
+
+graphs = GraphFactory()
@@ -1,28 +1,77 @@
-import os
 import asyncio
 from typing import TypedDict, Annotated, Sequence
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from langchain_core.tools import tool
+import os
 import subprocess
 import json
+from deadlines import call_with_deadline, deadline_scope, time_left, TURN_TIMEOUT
+from dedup import deduplicate
+from cassette import ReplayableChatModel
+from graph_factory import graphs, chat_model
 
 load_dotenv()
 
 # Define the state structure
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[HumanMessage | AIMessage | ToolMessage], "The messages in the conversation"]
+    messages: Annotated[Sequence[HumanMessage | AIMessage | ToolMessage], add_messages]
     next: str
 
-# Initialize the LLM
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# Command that starts the MCP server for each tool call
+SERVER_COMMAND = ["python", "server.py"]
+
+def call_server_tool(name: str, arguments: dict) -> str:
+    """Start the MCP server, call one tool over JSON-RPC on stdio and return its text
+
+    Raises DeadlineExceeded when the turn runs out first, so a deduplicated caller with time
+    left can take over the call.
+    """
+    messages = [
+        {"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "langgraph-app", "version": "0.1.0"}
+        }},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+    ]
+
+    def read_response(stdout):
+        # The server does not exit when stdin closes, so stop at the response to our call
+        for line in stdout:
+            message = json.loads(line)
+            if message.get("id") == 1:
+                return message
+        raise RuntimeError("MCP server exited without a response")
+
+    # The server gives its upstream calls what is left of our turn instead of the full TOOL_TIMEOUT
+    process = subprocess.Popen(
+        SERVER_COMMAND,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        env={**os.environ, "TOOL_TIMEOUT": str(time_left())}
+    )
+    try:
+        process.stdin.write("".join(json.dumps(message) + "\n" for message in messages))
+        process.stdin.flush()
+        response = call_with_deadline(read_response, process.stdout)
+    finally:
+        process.kill()
+        process.wait()
+
+    if "error" in response:
+        raise RuntimeError(response["error"].get("message", "Unknown MCP error"))
+    content = response["result"].get("content", [])
+    return content[0]["text"] if content else ""
+
+# Identical idempotent reads that are in flight share a single server process
+read_server_tool = deduplicate(call_server_tool)
 
 # Custom tools that will call the MCP server tools
 @tool
@@ -30,20 +79,7 @@ def web_search(query: str) -> str:
     """Search the web for information about the given query"""
     try:
         # Call the MCP server using subprocess
-        result = subprocess.run(
-            ["python", "server.py"],
-            input=json.dumps({
-                "method": "tools/call",
-                "params": {
-                    "name": "web_search",
-                    "arguments": {"query": query}
-                }
-            }),
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.stdout
+        return read_server_tool("web_search", {"query": query})
     except Exception as e:
         return f"Error calling web search: {str(e)}"
 
@@ -51,20 +87,7 @@ def web_search(query: str) -> str:
 def roll_dice(notation: str, num_rolls: int = 1) -> str:
     """Roll the dice with the given notation (e.g., '2d6', '1d20')"""
     try:
-        result = subprocess.run(
-            ["python", "server.py"],
-            input=json.dumps({
-                "method": "tools/call",
-                "params": {
-                    "name": "roll_dice",
-                    "arguments": {"notation": notation, "num_rolls": num_rolls}
-                }
-            }),
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.stdout
+        return call_server_tool("roll_dice", {"notation": notation, "num_rolls": num_rolls})
     except Exception as e:
         return f"Error rolling dice: {str(e)}"
 
@@ -72,83 +95,105 @@ def roll_dice(notation: str, num_rolls: int = 1) -> str:
 def get_stock_data(symbol: str) -> str:
     """Get real-time stock data from Yahoo Finance for the given symbol"""
     try:
-        result = subprocess.run(
-            ["python", "server.py"],
-            input=json.dumps({
-                "method": "tools/call",
-                "params": {
-                    "name": "yfinance_data",
-                    "arguments": {"symbol": symbol}
-                }
-            }),
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.stdout
+        return read_server_tool("yfinance_data", {"symbol": symbol})
     except Exception as e:
         return f"Error getting stock data: {str(e)}"
 
-# Create the tool node
 tools = [web_search, roll_dice, get_stock_data]
-tool_node = ToolNode(tools)
 
 # Define the agent function
-def agent(state: AgentState) -> AgentState:
-    """The main agent that decides what to do next"""
-    messages = state["messages"]
-    
-    # Get the response from the LLM
-    response = llm.invoke(messages)
-    
-    # Check if the response contains tool calls
-    if response.tool_calls:
-        # If there are tool calls, we need to execute them
-        return {"messages": [response], "next": "tools"}
-    else:
-        # If no tool calls, we're done
-        return {"messages": [response], "next": END}
+def make_agent(llm_with_tools):
+    """The agent node, calling the given tool-bound model"""
+    def agent(state: AgentState) -> AgentState:
+        """The main agent that decides what to do next"""
+        messages = state["messages"]
+        
+        # Get the response from the LLM within what is left of the turn budget
+        response = llm_with_tools.invoke(messages, timeout=time_left(TURN_TIMEOUT))
+        
+        # Check if the response contains tool calls
+        if response.tool_calls:
+            # If there are tool calls, we need to execute them
+            return {"messages": [response], "next": "tools"}
+        else:
+            # If no tool calls, we're done
+            return {"messages": [response], "next": END}
+
+    return agent
 
 # Define the should_continue function
 def should_continue(state: AgentState) -> str:
     """Determine if we should continue or end"""
     last_message = state["messages"][-1]
     
-    # If the last message is from a tool, we should continue
-    if isinstance(last_message, ToolMessage):
-        return "agent"
+    # If the agent asked for tools, run them
+    if isinstance(last_message, AIMessage) and last_message.tool_calls:
+        return "tools"
     else:
         return END
 
-# Create the graph
-workflow = StateGraph(AgentState)
+def build_graph(stage, llm_with_tools=None):
+    """Build and compile the graph, timing each stage, see graph_factory.py"""
+    if llm_with_tools is None:
+        # The chat model and its HTTP client are shared with the other graphs
+        with stage("llm"):
+            llm = chat_model()
+        # Bound model calls can be recorded and replayed through the cassette
+        with stage("bind_tools"):
+            llm_with_tools = ReplayableChatModel(llm.bind_tools(tools))
+
+    # Create the tool node
+    with stage("tool_node"):
+        tool_node = ToolNode(tools)
+
+    # Create the graph
+    with stage("graph"):
+        workflow = StateGraph(AgentState)
+
+        # Add nodes
+        workflow.add_node("agent", make_agent(llm_with_tools))
+        workflow.add_node("tools", tool_node)
+
+        # Add edges
+        workflow.add_edge("tools", "agent")
+        workflow.add_conditional_edges(
+            "agent",
+            should_continue,
+            {
+                "tools": "tools",
+                END: END
+            }
+        )
+
+        # Set the entry point
+        workflow.set_entry_point("agent")
 
-# Add nodes
-workflow.add_node("agent", agent)
-workflow.add_node("tools", tool_node)
+    # Compile the graph
+    with stage("compile"):
+        return workflow.compile()
 
-# Add edges
-workflow.add_edge("tools", "agent")
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "tools": "tools",
-        END: END
-    }
-)
+def get_app(llm_with_tools=None):
+    """The compiled graph, built on first use and cached per configuration
 
-# Set the entry point
-workflow.set_entry_point("agent")
+    llm_with_tools replaces the tool-bound OpenAI model, e.g. with a scripted one. Such a
+    graph is built on every call and not cached, keep it for as long as it is needed.
+    """
+    if llm_with_tools is not None:
+        return graphs.build("subprocess", build_graph, llm_with_tools=llm_with_tools)
+    return graphs.get("subprocess", build_graph)
 
-# Compile the graph
-app = workflow.compile()
+def __getattr__(name):
+    # The graph is no longer compiled at import, `app` builds it on first access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Function to run the application
-def run_agent(user_input: str) -> str:
-    """Run the agent with the given user input"""
+def run_agent(user_input: str, timeout: float = TURN_TIMEOUT) -> str:
+    """Run the agent with the given user input, giving up after timeout seconds"""
     messages = [HumanMessage(content=user_input)]
-    result = app.invoke({"messages": messages})
+    with deadline_scope(timeout):
+        result = get_app().invoke({"messages": messages})
     
     # Return the last AI message
     for message in reversed(result["messages"]):
@@ -3,41 +3,65 @@ import asyncio
 from typing import TypedDict, Annotated, Sequence
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from langchain_core.tools import tool
-from mcp.client.stdio import stdio_client
-import json
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client, get_default_environment
+from contextlib import asynccontextmanager
+from deadlines import DeadlineExceeded, deadline_scope, time_left, TURN_TIMEOUT
+from cassette import ReplayableChatModel
+from graph_factory import graphs, chat_model
+from dedup import deduplicate
 
 load_dotenv()
 
 # Define the state structure
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[HumanMessage | AIMessage | ToolMessage], "The messages in the conversation"]
+    messages: Annotated[Sequence[HumanMessage | AIMessage | ToolMessage], add_messages]
     next: str
 
-# Initialize the LLM
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-    api_key=os.getenv("OPENAI_API_KEY")
+# MCP Client setup
+# The server only inherits a minimal environment, pass our cassette and tuning settings on
+SERVER_SETTINGS = ("CASSETTE_", "TOOL_TIMEOUT", "ENABLE_HEDGING", "ENABLE_PROFILING", "PROFILE_")
+server_params = StdioServerParameters(
+    command="python",
+    args=["server.py"],
+    env={**get_default_environment(), **{k: v for k, v in os.environ.items() if k.startswith(SERVER_SETTINGS)}}
 )
 
-# MCP Client setup
+@asynccontextmanager
 async def get_mcp_client():
     """Get an MCP client connected to our server"""
-    client = await stdio_client(["python", "server.py"])
-    return client
+    # Each call starts its own server, which gives its upstream calls what is left of our turn
+    params = server_params.model_copy(update={"env": {**(server_params.env or {}), "TOOL_TIMEOUT": str(time_left())}})
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as client:
+            await client.initialize()
+            yield client
+
+async def call_mcp_tool(name: str, arguments: dict):
+    """Call a tool on the MCP server, cancelling it when the turn deadline expires"""
+    async def call():
+        async with get_mcp_client() as client:
+            return await client.call_tool(name, arguments)
+
+    try:
+        return await asyncio.wait_for(call(), timeout=time_left())
+    except TimeoutError as e:
+        # Deduplicated followers with time left take over a call that ran out of ours
+        raise DeadlineExceeded(f"{name} did not finish within the turn deadline") from e
+
+# Identical idempotent reads that are in flight share a single server call
+read_mcp_tool = deduplicate(call_mcp_tool)
 
 # Custom tools that will call the MCP server
 @tool
 async def web_search(query: str) -> str:
     """Search the web for information about the given query"""
     try:
-        client = await get_mcp_client()
-        result = await client.call_tool("web_search", {"query": query})
-        await client.aclose()
+        result = await read_mcp_tool("web_search", {"query": query})
         return result.content[0].text if result.content else "No results found"
     except Exception as e:
         return f"Error calling web search: {str(e)}"
@@ -46,9 +70,7 @@ async def web_search(query: str) -> str:
 async def roll_dice(notation: str, num_rolls: int = 1) -> str:
     """Roll the dice with the given notation (e.g., '2d6', '1d20')"""
     try:
-        client = await get_mcp_client()
-        result = await client.call_tool("roll_dice", {"notation": notation, "num_rolls": num_rolls})
-        await client.aclose()
+        result = await call_mcp_tool("roll_dice", {"notation": notation, "num_rolls": num_rolls})
         return result.content[0].text if result.content else "Error rolling dice"
     except Exception as e:
         return f"Error rolling dice: {str(e)}"
@@ -57,73 +79,106 @@ async def roll_dice(notation: str, num_rolls: int = 1) -> str:
 async def get_stock_data(symbol: str) -> str:
     """Get real-time stock data from Yahoo Finance for the given symbol"""
     try:
-        client = await get_mcp_client()
-        result = await client.call_tool("yfinance_data", {"symbol": symbol})
-        await client.aclose()
+        result = await read_mcp_tool("yfinance_data", {"symbol": symbol})
         return result.content[0].text if result.content else "No stock data found"
     except Exception as e:
         return f"Error getting stock data: {str(e)}"
 
-# Create the tool node
 tools = [web_search, roll_dice, get_stock_data]
-tool_node = ToolNode(tools)
 
 # Define the agent function
-def agent(state: AgentState) -> AgentState:
-    """The main agent that decides what to do next"""
-    messages = state["messages"]
-    
-    # Get the response from the LLM
-    response = llm.invoke(messages)
-    
-    # Check if the response contains tool calls
-    if response.tool_calls:
-        # If there are tool calls, we need to execute them
-        return {"messages": [response], "next": "tools"}
-    else:
-        # If no tool calls, we're done
-        return {"messages": [response], "next": END}
+def make_agent(llm_with_tools):
+    """The agent node, calling the given tool-bound model"""
+    def agent(state: AgentState) -> AgentState:
+        """The main agent that decides what to do next"""
+        messages = state["messages"]
+        
+        # Get the response from the LLM within what is left of the turn budget
+        response = llm_with_tools.invoke(messages, timeout=time_left(TURN_TIMEOUT))
+        
+        # Check if the response contains tool calls
+        if response.tool_calls:
+            # If there are tool calls, we need to execute them
+            return {"messages": [response], "next": "tools"}
+        else:
+            # If no tool calls, we're done
+            return {"messages": [response], "next": END}
+
+    return agent
 
 # Define the should_continue function
 def should_continue(state: AgentState) -> str:
     """Determine if we should continue or end"""
     last_message = state["messages"][-1]
     
-    # If the last message is from a tool, we should continue
-    if isinstance(last_message, ToolMessage):
-        return "agent"
+    # If the agent asked for tools, run them
+    if isinstance(last_message, AIMessage) and last_message.tool_calls:
+        return "tools"
     else:
         return END
 
-# Create the graph
-workflow = StateGraph(AgentState)
-
-# Add nodes
-workflow.add_node("agent", agent)
-workflow.add_node("tools", tool_node)
-
-# Add edges
-workflow.add_edge("tools", "agent")
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "tools": "tools",
-        END: END
-    }
-)
-
-# Set the entry point
-workflow.set_entry_point("agent")
-
-# Compile the graph
-app = workflow.compile()
+def build_graph(stage, llm_with_tools=None):
+    """Build and compile the graph, timing each stage, see graph_factory.py"""
+    if llm_with_tools is None:
+        # The chat model and its HTTP client are shared with the other graphs
+        with stage("llm"):
+            llm = chat_model()
+        # Bound model calls can be recorded and replayed through the cassette
+        with stage("bind_tools"):
+            llm_with_tools = ReplayableChatModel(llm.bind_tools(tools))
+
+    # Create the tool node
+    with stage("tool_node"):
+        tool_node = ToolNode(tools)
+
+    # Create the graph
+    with stage("graph"):
+        workflow = StateGraph(AgentState)
+
+        # Add nodes
+        workflow.add_node("agent", make_agent(llm_with_tools))
+        workflow.add_node("tools", tool_node)
+
+        # Add edges
+        workflow.add_edge("tools", "agent")
+        workflow.add_conditional_edges(
+            "agent",
+            should_continue,
+            {
+                "tools": "tools",
+                END: END
+            }
+        )
+
+        # Set the entry point
+        workflow.set_entry_point("agent")
+
+    # Compile the graph
+    with stage("compile"):
+        return workflow.compile()
+
+def get_app(llm_with_tools=None):
+    """The compiled graph, built on first use and cached per configuration
+
+    llm_with_tools replaces the tool-bound OpenAI model, e.g. with a scripted one. Such a
+    graph is built on every call and not cached, keep it for as long as it is needed.
+    """
+    if llm_with_tools is not None:
+        return graphs.build("mcp_client", build_graph, llm_with_tools=llm_with_tools)
+    return graphs.get("mcp_client", build_graph)
+
+def __getattr__(name):
+    # The graph is no longer compiled at import, `app` builds it on first access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Function to run the application
-async def run_agent(user_input: str) -> str:
-    """Run the agent with the given user input"""
+async def run_agent(user_input: str, timeout: float = TURN_TIMEOUT) -> str:
+    """Run the agent with the given user input, giving up after timeout seconds"""
     messages = [HumanMessage(content=user_input)]
-    result = await app.ainvoke({"messages": messages})
+    with deadline_scope(timeout):
+        result = await asyncio.wait_for(get_app().ainvoke({"messages": messages}), timeout=timeout)
     
     # Return the last AI message
     for message in reversed(result["messages"]):
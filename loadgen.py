@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+MCP Load Generator
+Opens many client sessions against server.py over stdio or HTTP (SSE) and drives a mix of
+roll_dice, web_search and yfinance_data calls at a target rate with the upstreams stubbed.
+Reports throughput, latency percentiles, error rates and server RSS over time as JSON.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import subprocess
+from contextlib import AsyncExitStack
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+
+from benchmark import STUB_SERVER_COMMAND, summarize, rss_mb, child_pids
+import stub_backends
+
+# Arguments the generated calls pick from
+DICE_NOTATIONS = ["1d20", "2d6", "3d6", "4d6k3", "2d20k1"]
+SEARCH_QUERIES = ["latest AI news", "python asyncio tutorial", "MCP protocol", "LangGraph agents", "Tesla earnings"]
+STOCK_SYMBOLS = ["AAPL", "MSFT", "TSLA", "NVDA", "AMZN", "GOOGL"]
+
+
+def parse_mix(mix: str) -> dict:
+    """Parse 'roll_dice=5,web_search=3,yfinance_data=2' into tool weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def make_arguments(tool: str, rng: random.Random) -> dict:
+    if tool == "roll_dice":
+        return {"notation": rng.choice(DICE_NOTATIONS), "num_rolls": rng.randint(1, 3)}
+    if tool == "web_search":
+        return {"query": rng.choice(SEARCH_QUERIES)}
+    if tool == "yfinance_data":
+        return {"symbol": rng.choice(STOCK_SYMBOLS)}
+    raise ValueError(f"Unknown tool in mix: {tool}")
+
+
+def start_http_server(port: int) -> subprocess.Popen:
+    """Start server.py on the stub backends with the SSE transport and wait until it listens"""
+    env = {**os.environ, "MCP_TRANSPORT": "sse", "FASTMCP_HOST": "127.0.0.1", "FASTMCP_PORT": str(port)}
+    process = subprocess.Popen(STUB_SERVER_COMMAND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("MCP server exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"MCP server did not listen on port {port}")
+
+
+async def open_sessions(stack: AsyncExitStack, transport: str, count: int, url: str = None) -> list:
+    """Open and initialize `count` client sessions, each stdio session gets its own server"""
+    params = StdioServerParameters(command=STUB_SERVER_COMMAND[0], args=STUB_SERVER_COMMAND[1:], env=dict(os.environ))
+    sessions = []
+    for _ in range(count):
+        if transport == "stdio":
+            read, write = await stack.enter_async_context(stdio_client(params))
+        else:
+            read, write = await stack.enter_async_context(sse_client(url))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        sessions.append(session)
+    return sessions
+
+
+async def drive(sessions: list, weights: dict, rate: float, duration: float, rng: random.Random,
+                server_pids, sample_interval: float):
+    """Issue calls open-loop at `rate` per second for `duration` seconds
+
+    Returns the completed calls as (finished at, tool, latency, error) and RSS samples.
+    """
+    calls, samples, in_flight = [], [], set()
+    tools, tool_weights = list(weights), list(weights.values())
+    started = time.perf_counter()
+
+    async def call(session, tool, arguments):
+        sent = time.perf_counter()
+        error = None
+        try:
+            result = await session.call_tool(tool, arguments)
+            if result.isError:
+                error = result.content[0].text if result.content else "Tool error"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        done = time.perf_counter()
+        calls.append((done - started, tool, done - sent, error))
+
+    async def sample():
+        while True:
+            rss = [rss_mb(pid) for pid in server_pids()]
+            samples.append({
+                "t_s": round(time.perf_counter() - started, 2),
+                "server_rss_mb": round(sum(r for r in rss if r is not None), 1) if any(r is not None for r in rss) else None,
+                "in_flight": sum(not task.done() for task in in_flight),
+            })
+            await asyncio.sleep(sample_interval)
+
+    sampler = asyncio.create_task(sample())
+    sent = 0
+    while True:
+        # Open loop: the schedule does not wait for slow calls, so queueing shows up as latency
+        due = started + sent / rate
+        if due - started >= duration:
+            break
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        tool = rng.choices(tools, tool_weights)[0]
+        task = asyncio.create_task(call(sessions[sent % len(sessions)], tool, make_arguments(tool, rng)))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        sent += 1
+
+    if in_flight:
+        await asyncio.wait(in_flight, timeout=60)
+    sampler.cancel()
+    return sent, calls, samples, time.perf_counter() - started
+
+
+def build_report(config: dict, sent: int, calls: list, samples: list, elapsed: float, sample_interval: float) -> dict:
+    errors = [call for call in calls if call[3] is not None]
+    per_tool = {}
+    for tool in sorted({call[1] for call in calls}):
+        tool_calls = [call for call in calls if call[1] == tool]
+        per_tool[tool] = {
+            **summarize([call[2] for call in tool_calls]),
+            "errors": sum(call[3] is not None for call in tool_calls),
+        }
+
+    # Throughput and latency per sampling window, next to the server RSS
+    timeline = []
+    for sample in samples:
+        window = [call for call in calls if sample["t_s"] - sample_interval < call[0] <= sample["t_s"]]
+        timeline.append({
+            **sample,
+            "completed_per_s": round(len(window) / sample_interval, 2),
+            "errors": sum(call[3] is not None for call in window),
+            "p95_ms": summarize([call[2] for call in window])["p95_ms"],
+        })
+
+    return {
+        "config": config,
+        "sent": sent,
+        "completed": len(calls),
+        "lost": sent - len(calls),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(calls), 4) if calls else 0.0,
+        "error_samples": sorted({call[3] for call in errors})[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(calls) / elapsed, 3) if elapsed else 0.0,
+        "latency": summarize([call[2] for call in calls]),
+        "tools": per_tool,
+        "timeline": timeline,
+    }
+
+
+async def run(args) -> dict:
+    weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    server = None
+    async with AsyncExitStack() as stack:
+        if args.transport == "sse":
+            server = start_http_server(args.port)
+            stack.callback(server.kill)
+            server_pids = lambda: [server.pid]
+            url = f"http://127.0.0.1:{args.port}/sse"
+        else:
+            server_pids = child_pids
+            url = None
+
+        sessions = await open_sessions(stack, args.transport, args.sessions, url)
+        sent, calls, samples, elapsed = await drive(
+            sessions, weights, args.rate, args.duration, rng, server_pids, args.sample_interval
+        )
+
+    config = {
+        "transport": args.transport,
+        "sessions": args.sessions,
+        "target_rate": args.rate,
+        "duration_s": args.duration,
+        "mix": weights,
+        "search_latency_s": args.search_latency,
+        "stock_latency_s": args.stock_latency,
+    }
+    return build_report(config, sent, calls, samples, elapsed, args.sample_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the MCP server")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio",
+                        help="stdio starts one server per session, sse shares one HTTP server")
+    parser.add_argument("--sessions", type=int, default=4, help="Client sessions to open")
+    parser.add_argument("--rate", type=float, default=20, help="Target calls per second across all sessions")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to generate load for")
+    parser.add_argument("--mix", default="roll_dice=5,web_search=3,yfinance_data=2",
+                        help="Tool weights, e.g. 'roll_dice=5,web_search=3,yfinance_data=2'")
+    parser.add_argument("--search-latency", type=float, default=stub_backends.SEARCH_LATENCY,
+                        help="Seconds per stubbed web search")
+    parser.add_argument("--stock-latency", type=float, default=stub_backends.STOCK_LATENCY,
+                        help="Seconds per stubbed Yahoo Finance lookup")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the sse transport")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the call mix and arguments")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    # The server subprocesses read the stub latencies from the environment
+    os.environ["STUB_SEARCH_LATENCY"] = str(args.search_latency)
+    os.environ["STUB_STOCK_LATENCY"] = str(args.stock_latency)
+
+    report = asyncio.run(run(args))
+    print(f"{args.transport} sessions={args.sessions} target={args.rate}/s -> {report['throughput_rps']:.2f}/s  "
+          f"p50={report['latency']['p50_ms']:.0f}ms p95={report['latency']['p95_ms']:.0f}ms  "
+          f"error_rate={report['error_rate']:.2%}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 MCP Tools Module
-This module provides the tools from the MCP server without triggering initialization issues
+This module provides the tools from the MCP server without triggering initialization issues.
+Each tool returns its structured payload as a dict, see tool_results.py
 """
 
 import os
@@ -8,56 +9,59 @@ from dotenv import load_dotenv
 from tavily import TavilyClient
 from dice_roller import DiceRoller
 import yfinance as yf
+from deadlines import hedged_call, time_left
+from dedup import deduplicate
+from cassette import upstream
+from profiling import profiled
+from tool_results import search_results, stock_quote, dice_rolls, error, select
 
 load_dotenv()
 
-def web_search(query: str) -> str:
+# Only the upstream fetches are deduplicated, they raise on failure so that a caller with time
+# left can take over from one whose turn ran out, the tools below turn errors into payloads
+@deduplicate(name="web_search")
+def _search(query: str) -> str:
+    client = TavilyClient(os.getenv("TAVILY_API_KEY"))
+    return hedged_call("web_search", lambda: upstream("tavily.search", query, client.get_search_context, query=query, timeout=time_left()))
+
+@deduplicate(name="yfinance_data")
+def _stock_info(symbol: str) -> dict:
+    # Each attempt uses its own Ticker since yfinance has no timeout to bound
+    return hedged_call("yfinance_data", lambda: upstream("yfinance.info", symbol, lambda: yf.Ticker(symbol).info))
+
+@profiled
+def web_search(query: str, fields: str = "") -> dict:
     """Search the web for information about the given query"""
     try:
-        client = TavilyClient(os.getenv("TAVILY_API_KEY"))
-        search_results = client.get_search_context(query=query)
-        return search_results
+        return select(search_results(query, _search(query)), fields)
     except Exception as e:
-        return f"Error searching the web: {str(e)}"
+        return error(f"Error searching the web: {str(e)}", query=query)
 
-def roll_dice(notation: str, num_rolls: int = 1) -> str:
+@profiled
+def roll_dice(notation: str, num_rolls: int = 1, fields: str = "") -> dict:
     """Roll the dice with the given notation"""
     try:
         roller = DiceRoller(notation, num_rolls)
-        return str(roller)
+        return select(dice_rolls(notation, roller.roll_multiple()), fields)
     except Exception as e:
-        return f"Error rolling dice: {str(e)}"
+        return error(f"Error rolling dice: {str(e)}", notation=notation)
 
-def yfinance_data(symbol: str) -> str:
+@profiled
+def yfinance_data(symbol: str, fields: str = "") -> dict:
     """Get real-time stock data from Yahoo Finance. Use this tool to get current stock prices, market data, and financial metrics for any stock symbol."""
     try:
         # Clean and validate symbol
         symbol = symbol.upper().strip()
         if not symbol or len(symbol) > 10:
-            return f"Invalid stock symbol: {symbol}"
-        
-        ticker = yf.Ticker(symbol)
+            return error(f"Invalid stock symbol: {symbol}", symbol=symbol)
         
         # Get basic info first
-        info = ticker.info
+        info = _stock_info(symbol)
         
         # Check if we got valid data
         if not info or info.get('regularMarketPrice') is None:
-            return f"No data found for stock symbol: {symbol}. Please verify the symbol is correct."
-        
-        # Format the result
-        result = f"Stock: {symbol}\n"
-        result += f"Price: ${info.get('currentPrice', info.get('regularMarketPrice', 'N/A'))}\n"
-        result += f"Previous Close: ${info.get('previousClose', 'N/A')}\n"
-        result += f"Change: {info.get('regularMarketChange', 'N/A')}\n"
-        result += f"Change %: {info.get('regularMarketChangePercent', 'N/A')}%\n"
-        result += f"Volume: {info.get('volume', 'N/A'):,}\n" if info.get('volume') else "Volume: N/A\n"
-        result += f"Market Cap: ${info.get('marketCap', 'N/A'):,}\n" if info.get('marketCap') else "Market Cap: N/A\n"
-        result += f"P/E Ratio: {info.get('trailingPE', 'N/A')}\n"
-        result += f"Dividend Yield: {info.get('dividendYield', 'N/A')}\n"
-        result += f"52 Week High: ${info.get('fiftyTwoWeekHigh', 'N/A')}\n"
-        result += f"52 Week Low: ${info.get('fiftyTwoWeekLow', 'N/A')}\n"
+            return error(f"No data found for stock symbol: {symbol}. Please verify the symbol is correct.", symbol=symbol)
         
-        return result
+        return select(stock_quote(symbol, info), fields)
     except Exception as e:
-        return f"Error getting stock data: {str(e)}"
+        return error(f"Error getting stock data: {str(e)}", symbol=symbol)
@@ -0,0 +1,199 @@
+"""
+Server Metrics
+Low-overhead counters and histograms for every MCP tool and upstream API, exposed as a
+JSON snapshot and in the Prometheus text format
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Serve /metrics in the Prometheus text format when running over HTTP (sse)
+ENABLE_PROMETHEUS = os.getenv("ENABLE_PROMETHEUS", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """Fixed-bucket histogram, recording is a bisect and a few additions"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket, within the observed range"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = max(self.buckets[i - 1] if i > 0 else 0.0, self.min)
+                upper = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def summary(self, scale: float = 1.0) -> dict:
+        return {
+            "mean": round(scale * self.sum / self.count, 3) if self.count else 0.0,
+            "p50": round(scale * self.quantile(0.50), 3),
+            "p95": round(scale * self.quantile(0.95), 3),
+            "p99": round(scale * self.quantile(0.99), 3),
+        }
+
+
+class CallStats:
+    """Calls, errors, latency and payload size of one tool or upstream service"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.calls, 4) if self.calls else 0.0,
+            "in_flight": self.in_flight,
+            "latency_ms": self.latency.summary(scale=1000),
+        }
+        if self.size.count:
+            snapshot["response_bytes"] = self.size.summary()
+        return snapshot
+
+
+class MetricsRegistry:
+    """Metrics for every tool and upstream service in this process"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.tools = defaultdict(CallStats)
+        self.upstreams = defaultdict(CallStats)
+        self._lock = threading.Lock()
+
+    def start(self, group: dict, name: str) -> float:
+        with self._lock:
+            group[name].in_flight += 1
+        return time.perf_counter()
+
+    def finish(self, group: dict, name: str, started: float, error: bool = False, size: int = None):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stats = group[name]
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.errors += error
+            stats.latency.observe(elapsed)
+            if size is not None:
+                stats.size.observe(size)
+
+    def snapshot(self) -> dict:
+        """JSON-ready view of all metrics, served by the server_stats tool and resource"""
+        from dedup import tool_calls
+        from deadlines import attempt_pools
+
+        with self._lock:
+            tools = {name: stats.snapshot() for name, stats in sorted(self.tools.items())}
+            upstreams = {name: stats.snapshot() for name, stats in sorted(self.upstreams.items())}
+
+        # Calls answered by an identical call already in flight, the closest thing we have to cache hits
+        for name, executed, shared in tool_calls.stats():
+            if name in tools:
+                tools[name]["deduplicated"] = shared
+                tools[name]["dedup_hit_rate"] = round(shared / (executed + shared), 4) if executed + shared else 0.0
+
+        # Attempts given up at the deadline or beaten by a hedge, the running ones still hold a worker
+        pools = {
+            name: {"workers": workers, "abandoned": abandoned, "abandoned_running": running}
+            for name, workers, abandoned, running in attempt_pools.stats()
+        }
+
+        return {"uptime_s": round(time.time() - self.started, 1), "tools": tools, "upstreams": upstreams,
+                "attempt_pools": pools}
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        from dedup import tool_calls
+        from deadlines import attempt_pools
+
+        # Every metric family is one block, its TYPE line followed by the samples of all tools
+        lines = []
+        with self._lock:
+            for prefix, label, group in (("mcp_tool", "tool", self.tools), ("mcp_upstream", "service", self.upstreams)):
+                lines += _family_lines(f"{prefix}_calls_total", "counter", label, {n: s.calls for n, s in group.items()})
+                lines += _family_lines(f"{prefix}_errors_total", "counter", label, {n: s.errors for n, s in group.items()})
+                lines += _family_lines(f"{prefix}_in_flight", "gauge", label, {n: s.in_flight for n, s in group.items()})
+                lines += _histogram_lines(f"{prefix}_latency_seconds", label, {n: s.latency for n, s in group.items()})
+                if prefix == "mcp_tool":
+                    lines += _histogram_lines(f"{prefix}_response_bytes", label, {n: s.size for n, s in group.items()})
+
+        lines += _family_lines("mcp_tool_deduplicated_total", "counter", "tool",
+                               {name: shared for name, executed, shared in tool_calls.stats()})
+
+        pools = attempt_pools.stats()
+        lines += _family_lines("mcp_attempt_pool_workers", "gauge", "pool", {name: w for name, w, _, _ in pools})
+        lines += _family_lines("mcp_attempt_pool_abandoned_total", "counter", "pool", {name: a for name, _, a, _ in pools})
+        lines += _family_lines("mcp_attempt_pool_abandoned_running", "gauge", "pool", {name: r for name, _, _, r in pools})
+        return "\n".join(lines) + "\n"
+
+
+def _family_lines(metric: str, kind: str, label: str, values: dict) -> list:
+    lines = [f"# TYPE {metric} {kind}"]
+    for name, value in sorted(values.items()):
+        lines.append(f'{metric}{{{label}="{name}"}} {value}')
+    return lines
+
+
+def _histogram_lines(metric: str, label: str, histograms: dict) -> list:
+    lines = [f"# TYPE {metric} histogram"]
+    for name, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip([*histogram.buckets, "+Inf"], histogram.counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum}')
+        lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def record_upstream(service: str, fn, *args, **kwargs):
+    """Run an upstream call and record its latency and outcome"""
+    started = registry.start(registry.upstreams, service)
+    try:
+        result = fn(*args, **kwargs)
+    except BaseException:
+        registry.finish(registry.upstreams, service, started, error=True)
+        raise
+    registry.finish(registry.upstreams, service, started)
+    return result
+
+
+def record_tool(name: str):
+    """Start timing a tool call, returns the token for finish_tool"""
+    return registry.start(registry.tools, name)
+
+
+def finish_tool(name: str, started: float, error: bool = False, size: int = None):
+    registry.finish(registry.tools, name, started, error=error, size=size)
@@ -0,0 +1,144 @@
+"""
+Speculative Tool Prefetch
+This module spots obvious intents (ticker symbols, dice notation) in the user input and
+starts the matching tool calls while the first LLM call is still in flight
+"""
+
+import re
+import time
+import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from deadlines import DeadlineExceeded, time_left
+
+# Dice notation as understood by DiceRoller, e.g. '2d6' or '4d6k3'
+DICE_PATTERN = re.compile(r"\b(\d+d\d+(?:k\d+)?)\b")
+
+# Explicit cashtags ($AAPL) are always taken, bare upper-case words only next to a stock hint
+CASHTAG_PATTERN = re.compile(r"\$([A-Za-z]{1,5})\b")
+TICKER_PATTERN = re.compile(r"\b([A-Z]{1,5})\b")
+STOCK_HINTS = ("stock", "share", "price", "ticker", "market", "quote", "trading")
+NOT_TICKERS = {
+    "I", "A", "AN", "AND", "OR", "THE", "OF", "IN", "ON", "TO", "FOR", "IS", "IT",
+    "AI", "ML", "OK", "US", "USA", "UK", "EU", "CEO", "CFO", "IPO", "ETF", "API",
+    "PE", "EPS", "USD", "NYSE", "WHAT", "HOW",
+}
+
+
+class _Prefetch:
+    """A prefetched call, the turns that claimed it may use it once each"""
+
+    _ids = itertools.count()
+
+    def __init__(self, future):
+        self.id = next(self._ids)
+        self.started = time.monotonic()
+        self.future = future
+        self.claims = 1
+        # Turns that claimed the call and have not discarded it yet
+        self.holders = 1
+        self.uses = 0
+
+
+class ToolPrefetcher:
+    """Runs likely tool calls ahead of the LLM and hands the results to the tool wrappers
+
+    One prefetcher serves every session. A turn asking for a call another turn is already
+    prefetching shares it, and the call is only dropped once every turn holding it is done.
+    A call every holder has used is not shared again, the next turn starts a fresh one.
+    """
+
+    def __init__(self, tools, max_workers=4, max_prefetch=3, max_age=30.0):
+        # tools maps a tool name ('yfinance_data', 'roll_dice') to the function that runs it
+        self.tools = tools
+        self.max_prefetch = max_prefetch
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def detect(self, text: str) -> list:
+        """Return the (tool name, args) calls the user input obviously asks for"""
+        calls = []
+
+        if "roll_dice" in self.tools:
+            for notation in DICE_PATTERN.findall(text):
+                calls.append(("roll_dice", (notation, 1)))
+
+        if "yfinance_data" in self.tools:
+            symbols = [s.upper() for s in CASHTAG_PATTERN.findall(text)]
+            if any(hint in text.lower() for hint in STOCK_HINTS):
+                symbols += [s for s in TICKER_PATTERN.findall(text) if s not in NOT_TICKERS]
+            for symbol in dict.fromkeys(symbols):
+                calls.append(("yfinance_data", (symbol,)))
+
+        return calls[:self.max_prefetch]
+
+    def start(self, text: str) -> list:
+        """Start the detected calls in the background and return this turn's keys for discard"""
+        keys = []
+        with self._lock:
+            self._expire()
+            for key in self.detect(text):
+                entry = self._pending.get(key)
+                if entry is not None and entry.uses < entry.claims:
+                    entry.claims += 1
+                    entry.holders += 1
+                else:
+                    name, args = key
+                    # Run in a copy of the caller's context so the call sees the turn deadline
+                    context = contextvars.copy_context()
+                    future = self._executor.submit(context.run, self.tools[name], *args)
+                    entry = self._pending[key] = _Prefetch(future)
+                # Tagged with the call, so a late discard cannot release one started after it
+                keys.append((*key, entry.id))
+        return keys
+
+    def take(self, name: str, *args):
+        """Claim the prefetched future for this call, or None if nothing was prefetched
+
+        A call is handed out at most once per turn that started it, so a turn asking for the
+        same roll twice gets a fresh one the second time.
+        """
+        with self._lock:
+            self._expire()
+            entry = self._pending.get((name, args))
+            if entry is None or entry.uses >= entry.claims:
+                return None
+            entry.uses += 1
+            return entry.future
+
+    def call(self, name: str, *args):
+        """Return the prefetched result if there is one, otherwise run the tool now"""
+        future = self.take(name, *args)
+        if future is not None:
+            try:
+                return future.result(timeout=time_left())
+            except FuturesTimeout:
+                raise DeadlineExceeded(f"Prefetched {name} call did not finish in time")
+        return self.tools[name](*args)
+
+    def discard(self, keys):
+        """Release the calls a turn started, once no turn holds a call it is dropped"""
+        with self._lock:
+            for name, args, call_id in keys:
+                key = (name, tuple(args))
+                entry = self._pending.get(key)
+                if entry is None or entry.id != call_id:
+                    continue
+                entry.holders -= 1
+                if entry.holders <= 0:
+                    self._drop(key)
+
+    def _drop(self, key):
+        entry = self._pending.pop(key)
+        # A call some tool is waiting on has to finish
+        if not entry.uses:
+            entry.future.cancel()
+
+    def _expire(self):
+        now = time.monotonic()
+        for key, entry in list(self._pending.items()):
+            if now - entry.started > self.max_age:
+                self._drop(key)
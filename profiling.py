@@ -0,0 +1,202 @@
+"""
+Tool Profiling
+Opt-in stack sampling and tracemalloc snapshots of a fraction of tool calls, written per tool as
+collapsed stacks for flamegraph.pl or speedscope and a log of the top allocation sites
+"""
+
+import os
+import sys
+import time
+import random
+import functools
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from collections import Counter, defaultdict
+
+# Off by default, a tool call then only pays for one attribute check
+ENABLE_PROFILING = os.getenv("ENABLE_PROFILING", "false").lower() in ("1", "true", "yes")
+# Fraction of tool calls to profile while enabled
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))
+# Seconds between stack samples of a profiled call
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))
+# Also diff tracemalloc snapshots around the profiled calls
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_NOT_SAMPLED = nullcontext()
+
+# Threads working on the call being profiled in this context, mapped to the frame they entered it in
+_profiled_threads = contextvars.ContextVar("profiled_threads", default=None)
+
+
+def _stack(thread: str, frame) -> str:
+    """One collapsed stack line, outermost frame first, prefixed by the thread name"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread)
+    return ";".join(reversed(names))
+
+
+def _working_on(frame, entry) -> bool:
+    # A suspended coroutine's frame is not on the stack, the event loop is busy with something else
+    while frame is not None:
+        if frame is entry:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def run_tracked(fn, *args, **kwargs):
+    """Run fn, sampling this thread too if it works for a call that is being profiled
+
+    Threads inherit the call through the context, so run fn in a copy of the caller's context.
+    """
+    threads = _profiled_threads.get()
+    if threads is None:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    threads[ident] = sys._getframe()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        threads.pop(ident, None)
+
+
+class ToolProfiler:
+    """Profiles a sample of tool calls, one at a time
+
+    While a call is profiled a background thread samples the stacks of the threads working on
+    it: the caller, while it is inside the profiled block, and the workers that run it through
+    `run_tracked`, such as hedged attempts. On the event loop only the samples where the profiled
+    coroutine is running count, not the selector or other sessions' tools. A call sampled while
+    another one is being profiled is skipped.
+    """
+
+    def __init__(self, enabled: bool = ENABLE_PROFILING, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 memory: bool = PROFILE_MEMORY, interval: float = PROFILE_INTERVAL, output_dir: str = PROFILE_DIR):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.memory = memory
+        self.interval = interval
+        self.output_dir = output_dir
+        self.profiled = defaultdict(int)
+        self._stacks = defaultdict(Counter)
+        self._busy = threading.Lock()
+
+    def configure(self, enabled: bool = None, sample_rate: float = None, memory: bool = None) -> dict:
+        """Change the settings at runtime, returns the settings in effect"""
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+            self.sample_rate = sample_rate
+        if memory is not None:
+            self.memory = memory
+        if enabled is not None:
+            self.enabled = enabled
+        return self.settings()
+
+    def settings(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "memory": self.memory,
+            "interval_s": self.interval,
+            "output_dir": os.path.abspath(self.output_dir),
+            "profiled": dict(self.profiled),
+        }
+
+    def profile(self, name: str):
+        """Context manager around one call of tool `name`, a no-op unless the call is sampled"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return _NOT_SAMPLED
+        # The frame running the `with` block, it is only on the stack while the call is running
+        return self._profile(name, sys._getframe(1))
+
+    @contextmanager
+    def _profile(self, name: str, entry):
+        if not self._busy.acquire(blocking=False):
+            yield
+            return
+        try:
+            memory = self.memory
+            started_tracing = memory and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            if memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.take_snapshot()
+
+            stacks = Counter()
+            threads = {threading.get_ident(): entry}
+            token = _profiled_threads.set(threads)
+            stop = threading.Event()
+            sampler = threading.Thread(target=self._sample, args=(threads, stacks, stop), name="tool-profiler", daemon=True)
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - started
+                stop.set()
+                sampler.join()
+                _profiled_threads.reset(token)
+                if memory:
+                    after = tracemalloc.take_snapshot()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    if started_tracing:
+                        tracemalloc.stop()
+                    self._write_memory(name, elapsed, peak, after.compare_to(before, "lineno"))
+                self._write_stacks(name, stacks)
+                self.profiled[name] += 1
+        finally:
+            self._busy.release()
+
+    def _sample(self, threads: dict, stacks: Counter, stop: threading.Event):
+        # Sample once right away so even calls shorter than the interval leave a trace
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, entry in list(threads.items()):
+                frame = frames.get(ident)
+                if frame is not None and _working_on(frame, entry):
+                    stacks[_stack(names.get(ident, str(ident)), frame)] += 1
+            if stop.wait(self.interval):
+                return
+
+    def _path(self, name: str, suffix: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"{name}{suffix}")
+
+    def _write_stacks(self, name: str, stacks: Counter):
+        # Accumulate every profiled call of the tool and rewrite the file from the total
+        self._stacks[name].update(stacks)
+        with open(self._path(name, ".collapsed"), "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(self._stacks[name].items()))
+
+    def _write_memory(self, name: str, elapsed: float, peak: int, differences: list, top: int = 10):
+        ignored = (tracemalloc.__file__, __file__, threading.__file__)
+        lines = [f"# {time.strftime('%Y-%m-%d %H:%M:%S')} {name} {elapsed * 1000:.1f}ms peak={peak / 1024:.1f}KiB"]
+        lines += [str(stat) for stat in differences if stat.traceback[0].filename not in ignored][:top]
+        with open(self._path(name, ".memory.txt"), "a") as f:
+            f.write("\n".join(lines) + "\n\n")
+
+
+profiler = ToolProfiler()
+
+
+def profiled(fn):
+    """Decorator that runs a sync tool under the shared profiler"""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return fn(*args, **kwargs)
+        with profiler.profile(fn.__name__):
+            return fn(*args, **kwargs)
+
+    return wrapper
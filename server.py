@@ -1,65 +1,146 @@
+import json
+import anyio
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
 from tavily import TavilyClient
 import os
 from dice_roller import DiceRoller
+from deadlines import deadline_scope, hedged_call, time_left, TOOL_TIMEOUT
+from dedup import deduplicate
+from cassette import upstream
+from metrics import registry, record_tool, finish_tool, ENABLE_PROMETHEUS
+from profiling import profiler
+from tool_results import search_results, stock_quote, dice_rolls, error, select, encode
 
 load_dotenv()
 
-mcp = FastMCP("mcp-server")
+def _carries_error(content) -> bool:
+    """Whether a tool result is an error payload, see tool_results.error"""
+    for item in content:
+        text = getattr(item, "text", None)
+        # Only parse the payloads that can be one
+        if text and '"error":' in text:
+            try:
+                payload = json.loads(text)
+            except ValueError:
+                continue
+            if isinstance(payload, dict) and "error" in payload:
+                return True
+    return False
+
+class InstrumentedFastMCP(FastMCP):
+    """FastMCP that records call counts, latency, payload size and errors for every tool, and profiles a sample of them"""
+
+    async def call_tool(self, name, arguments):
+        started = record_tool(name)
+        try:
+            if profiler.enabled:
+                with profiler.profile(name):
+                    content = await super().call_tool(name, arguments)
+            else:
+                content = await super().call_tool(name, arguments)
+        except Exception:
+            finish_tool(name, started, error=True)
+            raise
+        size = sum(len(item.text.encode()) for item in content if getattr(item, "text", None))
+        # Tools report failures as an error field, count those as errors too
+        finish_tool(name, started, error=_carries_error(content), size=size)
+        return content
+
+    def sse_app(self):
+        app = super().sse_app()
+        if ENABLE_PROMETHEUS:
+            from starlette.responses import PlainTextResponse
+            from starlette.routing import Route
+
+            async def prometheus_metrics(request):
+                return PlainTextResponse(registry.prometheus(), media_type="text/plain; version=0.0.4")
+
+            app.router.routes.append(Route("/metrics", endpoint=prometheus_metrics))
+        return app
+
+mcp = InstrumentedFastMCP("mcp-server")
 client = TavilyClient(os.getenv("TAVILY_API_KEY"))
 
+# Only the upstream fetches are deduplicated, so calls asking for different fields share them too
+@deduplicate(name="web_search")
+async def _search(query: str) -> str:
+    def search():
+        with deadline_scope(TOOL_TIMEOUT):
+            return hedged_call("web_search", lambda: upstream("tavily.search", query, client.get_search_context, query=query, timeout=time_left()))
+
+    # Run the blocking call off the event loop so concurrent sessions can share it
+    return await anyio.to_thread.run_sync(search)
+
+@deduplicate(name="yfinance_data")
+async def _stock_info(symbol: str) -> dict:
+    import yfinance as yf
+
+    # Each attempt uses its own Ticker since yfinance has no timeout to bound
+    def fetch_info():
+        with deadline_scope(TOOL_TIMEOUT):
+            return hedged_call("yfinance_data", lambda: upstream("yfinance.info", symbol, lambda: yf.Ticker(symbol).info))
+
+    return await anyio.to_thread.run_sync(fetch_info)
+
 @mcp.tool()
-def web_search(query: str) -> str:
-    """Search the web for information about the given query"""
-    search_results = client.get_search_context(query=query)
-    return search_results
+async def web_search(query: str, fields: str = "") -> str:
+    """Search the web for information about the given query. Returns JSON with the query and results (url, content); fields selects a subset, e.g. "results" or "text" for a one-line summary."""
+    try:
+        context = await _search(query)
+    except Exception as e:
+        return encode(error(f"Error searching the web: {str(e)}", query=query))
+    return encode(select(search_results(query, context), fields))
 
 @mcp.tool()
-def roll_dice(notation: str, num_rolls: int = 1) -> str:
-    """Roll the dice with the given notation"""
-    roller = DiceRoller(notation, num_rolls)
-    return str(roller)
+def roll_dice(notation: str, num_rolls: int = 1, fields: str = "") -> str:
+    """Roll the dice with the given notation. Returns JSON with the rolls, kept dice and totals of each roll; fields selects a subset, e.g. "totals" or "text" for a one-line summary."""
+    try:
+        roller = DiceRoller(notation, num_rolls)
+        results = roller.roll_multiple()
+    except Exception as e:
+        return encode(error(f"Error rolling dice: {str(e)}", notation=notation))
+    return encode(select(dice_rolls(notation, results), fields))
 
 """
 Add your own tool here, and then use it through Cursor!
 """
 @mcp.tool()
-def yfinance_data(symbol: str) -> str:
-    """Get real-time stock data from Yahoo Finance. Use this tool to get current stock prices, market data, and financial metrics for any stock symbol."""
-
-    import yfinance as yf
+async def yfinance_data(symbol: str, fields: str = "") -> str:
+    """Get real-time stock data from Yahoo Finance. Use this tool to get current stock prices, market data, and financial metrics for any stock symbol. Returns JSON with price, previous_close, change, change_pct, volume, market_cap, pe_ratio, dividend_yield, high_52w and low_52w; fields selects a subset, e.g. "price,change_pct" or "text" for a one-line summary."""
             
     # Clean and validate symbol
     symbol = symbol.upper().strip()
     if not symbol or len(symbol) > 10:
-        return f"Invalid stock symbol: {symbol}"
-    
-    
-    ticker = yf.Ticker(symbol)
+        return encode(error(f"Invalid stock symbol: {symbol}", symbol=symbol))
     
     # Get basic info first
-    info = ticker.info
+    try:
+        info = await _stock_info(symbol)
+    except Exception as e:
+        return encode(error(f"Error getting stock data: {str(e)}", symbol=symbol))
     
     # Check if we got valid data
     if not info or info.get('regularMarketPrice') is None:
-        return f"No data found for stock symbol: {symbol}. Please verify the symbol is correct."
-    
-    # Format the result
-    result = f"Stock: {symbol}\n"
-    result += f"Price: ${info.get('currentPrice', info.get('regularMarketPrice', 'N/A'))}\n"
-    result += f"Previous Close: ${info.get('previousClose', 'N/A')}\n"
-    result += f"Change: {info.get('regularMarketChange', 'N/A')}\n"
-    result += f"Change %: {info.get('regularMarketChangePercent', 'N/A')}%\n"
-    result += f"Volume: {info.get('volume', 'N/A'):,}\n" if info.get('volume') else "Volume: N/A\n"
-    result += f"Market Cap: ${info.get('marketCap', 'N/A'):,}\n" if info.get('marketCap') else "Market Cap: N/A\n"
-    result += f"P/E Ratio: {info.get('trailingPE', 'N/A')}\n"
-    result += f"Dividend Yield: {info.get('dividendYield', 'N/A')}\n"
-    result += f"52 Week High: ${info.get('fiftyTwoWeekHigh', 'N/A')}\n"
-    result += f"52 Week Low: ${info.get('fiftyTwoWeekLow', 'N/A')}\n"
-    
+        return encode(error(f"No data found for stock symbol: {symbol}. Please verify the symbol is correct.", symbol=symbol))
     
-    return result
+    return encode(select(stock_quote(symbol, info), fields))
+
+@mcp.tool()
+def server_stats() -> str:
+    """Get this server's per-tool call counts, latency percentiles, payload sizes, dedup hit rates and upstream error rates"""
+    return encode(registry.snapshot())
+
+@mcp.resource("stats://server", mime_type="application/json")
+def server_stats_resource() -> str:
+    """Per-tool and upstream metrics of this server as JSON"""
+    return json.dumps(registry.snapshot(), indent=2)
+
+@mcp.tool()
+def configure_profiling(enabled: bool | None = None, sample_rate: float | None = None, memory: bool | None = None) -> str:
+    """Turn stack sampling and tracemalloc snapshots of tool calls on or off, set the fraction of calls profiled, and report where the per-tool flamegraph stacks are written"""
+    return encode(profiler.configure(enabled, sample_rate, memory))
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    # stdio by default, MCP_TRANSPORT=sse serves HTTP on FASTMCP_HOST:FASTMCP_PORT
+    mcp.run(transport=os.getenv("MCP_TRANSPORT", "stdio"))
\ No newline at end of file
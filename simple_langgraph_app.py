@@ -2,104 +2,159 @@ import os
 from typing import TypedDict, Annotated, Sequence
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from langchain_core.tools import tool
 
 # Import the MCP tools from our separate module
 from mcp_tools import web_search, roll_dice, yfinance_data
+from tool_results import encode
+from prefetch import ToolPrefetcher
+from deadlines import deadline_scope, time_left, TURN_TIMEOUT
+from cassette import ReplayableChatModel
+from graph_factory import graphs, chat_model
 
 load_dotenv()
 
+# Speculatively start obvious tool calls alongside the first LLM call
+ENABLE_PREFETCH = os.getenv("ENABLE_PREFETCH", "false").lower() in ("1", "true", "yes")
+
 # Define the state structure
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[HumanMessage | AIMessage | ToolMessage], "The messages in the conversation"]
+    messages: Annotated[Sequence[HumanMessage | AIMessage | ToolMessage], add_messages]
     next: str
+    prefetched: list
 
-# Initialize the LLM
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# Prefetched results are handed to the tool wrappers below
+prefetcher = ToolPrefetcher({
+    "roll_dice": roll_dice,
+    "yfinance_data": yfinance_data,
+})
 
 # Create LangChain tools from the MCP server functions
 @tool
 def search_web(query: str) -> str:
     """Search the web for information about the given query"""
-    return web_search(query)
+    return encode(web_search(query))
 
 @tool
 def roll_dice_tool(notation: str, num_rolls: int = 1) -> str:
     """Roll the dice with the given notation (e.g., '2d6', '1d20')"""
-    return roll_dice(notation, num_rolls)
+    return encode(prefetcher.call("roll_dice", notation, num_rolls))
 
 @tool
 def get_stock_info(symbol: str) -> str:
     """Get real-time stock data from Yahoo Finance for the given symbol"""
-    return yfinance_data(symbol)
+    return encode(prefetcher.call("yfinance_data", symbol.upper().strip()))
 
-# Create the tool node
 tools = [search_web, roll_dice_tool, get_stock_info]
-tool_node = ToolNode(tools)
+
+# Define the prefetch function
+def prefetch(state: AgentState) -> AgentState:
+    """Start obvious tool calls in the background before the agent asks for them"""
+    user_input = state["messages"][-1].content
+    return {"prefetched": prefetcher.start(user_input)}
 
 # Define the agent function
-def agent(state: AgentState) -> AgentState:
-    """The main agent that decides what to do next"""
-    messages = state["messages"]
-    
-    # Get the response from the LLM
-    response = llm.invoke(messages)
-    
-    # Check if the response contains tool calls
-    if response.tool_calls:
-        # If there are tool calls, we need to execute them
-        return {"messages": [response], "next": "tools"}
-    else:
-        # If no tool calls, we're done
-        return {"messages": [response], "next": END}
+def make_agent(llm_with_tools):
+    """The agent node, calling the given tool-bound model"""
+    def agent(state: AgentState) -> AgentState:
+        """The main agent that decides what to do next"""
+        messages = state["messages"]
+        
+        # Get the response from the LLM within what is left of the turn budget
+        response = llm_with_tools.invoke(messages, timeout=time_left(TURN_TIMEOUT))
+        
+        # Check if the response contains tool calls
+        if response.tool_calls:
+            # If there are tool calls, we need to execute them
+            return {"messages": [response], "next": "tools"}
+        else:
+            # If no tool calls, we're done
+            return {"messages": [response], "next": END}
+
+    return agent
 
 # Define the should_continue function
 def should_continue(state: AgentState) -> str:
     """Determine if we should continue or end"""
     last_message = state["messages"][-1]
     
-    # If the last message is from a tool, we should continue
-    if isinstance(last_message, ToolMessage):
-        return "agent"
+    # If the agent asked for tools, run them
+    if isinstance(last_message, AIMessage) and last_message.tool_calls:
+        return "tools"
     else:
         return END
 
-# Create the graph
-workflow = StateGraph(AgentState)
-
-# Add nodes
-workflow.add_node("agent", agent)
-workflow.add_node("tools", tool_node)
-
-# Add edges
-workflow.add_edge("tools", "agent")
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "tools": "tools",
-        END: END
-    }
-)
-
-# Set the entry point
-workflow.set_entry_point("agent")
-
-# Compile the graph
-app = workflow.compile()
+def build_graph(stage, llm_with_tools=None, enable_prefetch: bool = ENABLE_PREFETCH):
+    """Build and compile the graph, timing each stage, see graph_factory.py"""
+    if llm_with_tools is None:
+        # The chat model and its HTTP client are shared with the other graphs
+        with stage("llm"):
+            llm = chat_model()
+        # Bound model calls can be recorded and replayed through the cassette
+        with stage("bind_tools"):
+            llm_with_tools = ReplayableChatModel(llm.bind_tools(tools))
+
+    # Create the tool node
+    with stage("tool_node"):
+        tool_node = ToolNode(tools)
+
+    # Create the graph
+    with stage("graph"):
+        workflow = StateGraph(AgentState)
+
+        # Add nodes
+        workflow.add_node("agent", make_agent(llm_with_tools))
+        workflow.add_node("tools", tool_node)
+
+        # Add edges
+        workflow.add_edge("tools", "agent")
+        workflow.add_conditional_edges(
+            "agent",
+            should_continue,
+            {
+                "tools": "tools",
+                END: END
+            }
+        )
+
+        # Set the entry point
+        if enable_prefetch:
+            workflow.add_node("prefetch", prefetch)
+            workflow.add_edge("prefetch", "agent")
+            workflow.set_entry_point("prefetch")
+        else:
+            workflow.set_entry_point("agent")
+
+    # Compile the graph
+    with stage("compile"):
+        return workflow.compile()
+
+def get_app(llm_with_tools=None, enable_prefetch: bool = ENABLE_PREFETCH):
+    """The compiled graph, built on first use and cached per configuration
+
+    llm_with_tools replaces the tool-bound OpenAI model, e.g. with a scripted one. Such a
+    graph is built on every call and not cached, keep it for as long as it is needed.
+    """
+    if llm_with_tools is not None:
+        return graphs.build("simple", build_graph, llm_with_tools=llm_with_tools, enable_prefetch=enable_prefetch)
+    return graphs.get("simple", build_graph, enable_prefetch=enable_prefetch)
+
+def __getattr__(name):
+    # The graph is no longer compiled at import, `app` builds it on first access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Function to run the application
-def run_agent(user_input: str) -> str:
-    """Run the agent with the given user input"""
+def run_agent(user_input: str, timeout: float = TURN_TIMEOUT) -> str:
+    """Run the agent with the given user input, giving up after timeout seconds"""
     messages = [HumanMessage(content=user_input)]
-    result = app.invoke({"messages": messages})
+    with deadline_scope(timeout):
+        result = get_app().invoke({"messages": messages})
+    prefetcher.discard(result.get("prefetched", []))
     
     # Return the last AI message
     for message in reversed(result["messages"]):
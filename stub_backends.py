@@ -0,0 +1,84 @@
+"""
+Stub Tool Backends
+Local stand-ins for Tavily and Yahoo Finance with configurable latency, so the tools can be
+exercised offline. Run `python -m stub_backends server.py` to start the MCP server on them.
+"""
+
+import os
+import sys
+import json
+import time
+import runpy
+import random
+
+# Latencies in seconds, read from the environment so server subprocesses pick them up too
+SEARCH_LATENCY = float(os.getenv("STUB_SEARCH_LATENCY", "0.3"))
+STOCK_LATENCY = float(os.getenv("STUB_STOCK_LATENCY", "0.2"))
+
+
+class StubTavilyClient:
+    """Answers get_search_context like TavilyClient, after SEARCH_LATENCY seconds"""
+
+    def __init__(self, api_key=None, **kwargs):
+        self.api_key = api_key
+
+    def get_search_context(self, query: str, timeout: float = 60, **kwargs) -> str:
+        time.sleep(min(SEARCH_LATENCY, timeout))
+        return json.dumps([
+            {"url": f"https://example.com/{i}", "content": f"Result {i} about {query}"}
+            for i in range(1, 6)
+        ])
+
+
+class StubTicker:
+    """Serves yfinance Ticker.info with plausible fields, after STOCK_LATENCY seconds"""
+
+    def __init__(self, symbol: str, **kwargs):
+        self.ticker = symbol
+
+    @property
+    def info(self) -> dict:
+        time.sleep(STOCK_LATENCY)
+        price = round(random.uniform(50, 500), 2)
+        return {
+            "symbol": self.ticker,
+            "currentPrice": price,
+            "regularMarketPrice": price,
+            "previousClose": round(price * 0.99, 2),
+            "regularMarketChange": round(price * 0.01, 2),
+            "regularMarketChangePercent": 1.0,
+            "volume": 12345678,
+            "marketCap": 987654321000,
+            "trailingPE": 25.4,
+            "dividendYield": 0.5,
+            "fiftyTwoWeekHigh": round(price * 1.2, 2),
+            "fiftyTwoWeekLow": round(price * 0.8, 2),
+        }
+
+
+def install(search_latency: float = None, stock_latency: float = None):
+    """Swap Tavily and yfinance for the stubs, call before importing server.py or mcp_tools"""
+    global SEARCH_LATENCY, STOCK_LATENCY
+    if search_latency is not None:
+        SEARCH_LATENCY = search_latency
+    if stock_latency is not None:
+        STOCK_LATENCY = stock_latency
+
+    import tavily
+    import yfinance
+    tavily.TavilyClient = StubTavilyClient
+    yfinance.Ticker = StubTicker
+
+    # Modules that already imported the client by name
+    for module in ("mcp_tools", "server"):
+        if module in sys.modules:
+            sys.modules[module].TavilyClient = StubTavilyClient
+            if hasattr(sys.modules[module], "client"):
+                sys.modules[module].client = StubTavilyClient()
+
+
+if __name__ == "__main__":
+    install()
+    script = sys.argv[1] if len(sys.argv) > 1 else "server.py"
+    sys.argv = sys.argv[1:]
+    runpy.run_path(script, run_name="__main__")
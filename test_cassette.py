@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for recording and replaying upstream calls
+"""
+
+import os
+import time
+import tempfile
+from cassette import Cassette, CassetteMiss, RecordedError
+
+
+def test_record_then_replay():
+    """Recorded responses, errors and timing come back on replay without calling upstream"""
+    path = os.path.join(tempfile.mkdtemp(), "upstream.jsonl")
+    recorder = Cassette(path, "record")
+
+    def quote(symbol):
+        time.sleep(0.1)
+        return {"symbol": symbol, "regularMarketPrice": 123.4}
+
+    def broken(query):
+        raise ConnectionError("upstream down")
+
+    assert recorder.call("yfinance.info", "AAPL", quote, "AAPL")["regularMarketPrice"] == 123.4
+    try:
+        recorder.call("tavily.search", "python", broken, "python")
+    except ConnectionError:
+        pass
+
+    def offline(*args):
+        raise AssertionError("replay must not call upstream")
+
+    replay = Cassette(path, "replay", latency_scale=1.0)
+    started = time.perf_counter()
+    assert replay.call("yfinance.info", "AAPL", offline) == {"symbol": "AAPL", "regularMarketPrice": 123.4}
+    assert time.perf_counter() - started >= 0.1
+
+    try:
+        replay.call("tavily.search", "python", offline)
+        assert False, "expected RecordedError"
+    except RecordedError as e:
+        assert "upstream down" in str(e)
+
+    try:
+        replay.call("yfinance.info", "MSFT", offline)
+        assert False, "expected CassetteMiss"
+    except CassetteMiss:
+        pass
+
+    # Scaled to zero the same traffic replays without delay
+    fast = Cassette(path, "replay", latency_scale=0)
+    started = time.perf_counter()
+    fast.call("yfinance.info", "AAPL", offline)
+    assert time.perf_counter() - started < 0.05
+
+
+if __name__ == "__main__":
+    test_record_then_replay()
+    print("✅ Cassette tests passed")
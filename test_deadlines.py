@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for deadline propagation and hedged requests
+"""
+
+import time
+import threading
+from deadlines import DeadlineExceeded, attempt_pools, call_with_deadline, deadline_scope, hedged_call, time_left
+
+
+def test_nested_scope_never_extends_outer():
+    """A tool scope inside a turn gets at most what is left of the turn"""
+    with deadline_scope(1.0):
+        with deadline_scope(30.0):
+            assert time_left(30.0) <= 1.0
+    assert time_left(5.0) == 5.0
+
+
+def test_expired_deadline_stops_blocking_call():
+    """A blocking call without its own timeout is abandoned when the turn runs out"""
+    started = time.monotonic()
+    with deadline_scope(0.2):
+        try:
+            call_with_deadline(time.sleep, 2)
+            assert False, "expected DeadlineExceeded"
+        except DeadlineExceeded:
+            pass
+    assert time.monotonic() - started < 1.0
+
+
+def test_hedged_request_returns_faster_attempt():
+    """A slow first attempt is overtaken by the hedged second attempt"""
+    attempts = []
+
+    def read():
+        attempts.append(1)
+        time.sleep(2 if len(attempts) == 1 else 0.05)
+        return len(attempts)
+
+    started = time.monotonic()
+    assert hedged_call("read", read, hedge=True, hedge_after=0.1) == 2
+    assert time.monotonic() - started < 1.0
+
+
+def test_hung_upstream_only_exhausts_its_own_pool():
+    """Abandoned attempts hold their workers and are counted, other upstreams keep theirs"""
+    release = threading.Event()
+
+    def pool_stats(name):
+        return {pool: (abandoned, running) for pool, _, abandoned, running in attempt_pools.stats()}[name]
+
+    for _ in range(attempt_pools.max_workers):
+        with deadline_scope(0.05):
+            try:
+                hedged_call("hung", release.wait)
+                assert False, "expected DeadlineExceeded"
+            except DeadlineExceeded:
+                pass
+    assert pool_stats("hung") == (attempt_pools.max_workers, attempt_pools.max_workers)
+
+    with deadline_scope(1.0):
+        assert hedged_call("healthy", lambda: "ok") == "ok"
+
+    release.set()
+    for _ in range(100):
+        if pool_stats("hung")[1] == 0:
+            break
+        time.sleep(0.01)
+    assert pool_stats("hung") == (attempt_pools.max_workers, 0)
+
+
+if __name__ == "__main__":
+    test_nested_scope_never_extends_outer()
+    test_expired_deadline_stops_blocking_call()
+    test_hedged_request_returns_faster_attempt()
+    test_hung_upstream_only_exhausts_its_own_pool()
+    print("✅ Deadline tests passed")
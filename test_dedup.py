@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for tool call deduplication
+"""
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dedup import deduplicate
+from deadlines import DeadlineExceeded, call_with_deadline, deadline_scope, time_left
+
+
+def test_concurrent_identical_calls_run_once():
+    """Identical calls in flight share one execution, different arguments do not"""
+    calls = []
+
+    @deduplicate
+    def lookup(symbol):
+        calls.append(symbol)
+        time.sleep(0.2)
+        return f"Stock: {symbol}"
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lookup, ["AAPL"] * 5 + ["MSFT"]))
+
+    assert results == ["Stock: AAPL"] * 5 + ["Stock: MSFT"]
+    assert sorted(calls) == ["AAPL", "MSFT"]
+
+    # Nothing is cached once the call has finished
+    lookup("AAPL")
+    assert calls.count("AAPL") == 2
+
+
+def test_async_calls_share_result_and_error():
+    """Async callers share the leader's result, and its error"""
+    calls = []
+
+    @deduplicate
+    async def search(query):
+        calls.append(query)
+        await asyncio.sleep(0.1)
+        if query == "bad":
+            raise ValueError("upstream failed")
+        return f"Results for {query}"
+
+    async def main():
+        results = await asyncio.gather(*(search("python") for _ in range(4)))
+        errors = await asyncio.gather(search("bad"), search("bad"), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert results == ["Results for python"] * 4
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert calls == ["python", "bad"]
+
+
+def test_caller_with_time_left_takes_over_from_expired_leader():
+    """A follower with a longer budget reruns the call instead of getting the leader's timeout"""
+    calls = []
+
+    @deduplicate
+    def fetch(symbol):
+        calls.append(symbol)
+        call_with_deadline(time.sleep, 0.4)
+        return f"Stock: {symbol}"
+
+    def session(budget):
+        with deadline_scope(budget):
+            try:
+                return fetch("AAPL")
+            except DeadlineExceeded:
+                return "timed out"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        short = executor.submit(session, 0.1)
+        time.sleep(0.02)
+        long = executor.submit(session, 5)
+        assert short.result() == "timed out"
+        assert long.result() == "Stock: AAPL"
+    assert calls == ["AAPL", "AAPL"]
+
+    calls.clear()
+
+    @deduplicate
+    async def read(query):
+        calls.append(query)
+        try:
+            await asyncio.wait_for(asyncio.sleep(0.4), timeout=time_left())
+        except TimeoutError as e:
+            raise DeadlineExceeded("read did not finish in time") from e
+        return f"Results for {query}"
+
+    async def async_session(budget, delay):
+        await asyncio.sleep(delay)
+        with deadline_scope(budget):
+            try:
+                return await read("python")
+            except DeadlineExceeded:
+                return "timed out"
+
+    async def main():
+        return await asyncio.gather(async_session(0.1, 0), async_session(5, 0.02))
+
+    assert asyncio.run(main()) == ["timed out", "Results for python"]
+    assert calls == ["python", "python"]
+
+
+if __name__ == "__main__":
+    test_concurrent_identical_calls_run_once()
+    test_async_calls_share_result_and_error()
+    test_caller_with_time_left_takes_over_from_expired_leader()
+    print("✅ Deduplication tests passed")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test script for the lazy graph factory
+"""
+
+from graph_factory import GraphFactory
+
+
+def test_graphs_are_built_once_per_configuration():
+    """The build runs on first use only, and each configuration gets its own graph"""
+    factory = GraphFactory()
+    builds = []
+
+    def build(stage, prefetch=False):
+        with stage("graph"):
+            builds.append(prefetch)
+        with stage("compile"):
+            return object()
+
+    first = factory.get("simple", build, prefetch=False)
+    assert factory.get("simple", build, prefetch=False) is first
+    assert factory.get("simple", build, prefetch=True) is not first
+    assert builds == [False, True]
+
+    times = factory.build_times("simple")
+    assert [entry["config"] for entry in times] == [{"prefetch": False}, {"prefetch": True}]
+    assert set(times[0]["stages_ms"]) == {"graph", "compile", "total"}
+    assert factory.build_times("subprocess") == []
+
+
+def test_overridden_models_are_not_cached():
+    """Graphs around a per-call model are built every time, and their timings stay bounded"""
+    factory = GraphFactory(history=3)
+
+    def build(stage, llm_with_tools=None):
+        with stage("compile"):
+            return [llm_with_tools]
+
+    # Unhashable, like a LangChain RunnableBinding
+    model = {"bound": "tools"}
+    graph = factory.build("simple", build, llm_with_tools=model)
+    assert graph == [model]
+    assert factory.build("simple", build, llm_with_tools=model) is not graph
+
+    for _ in range(5):
+        factory.build("simple", build, llm_with_tools={})
+    assert len(factory.build_times()) == 3
+    assert factory.build_times("simple")[-1]["config"] == {"llm_with_tools": "dict"}
+
+
+if __name__ == "__main__":
+    test_graphs_are_built_once_per_configuration()
+    test_overridden_models_are_not_cached()
+    print("✅ Graph factory tests passed")
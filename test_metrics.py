@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the server metrics
+"""
+
+from metrics import Histogram, MetricsRegistry, LATENCY_BUCKETS
+
+
+def test_histogram_quantiles_stay_in_observed_range():
+    """Bucket interpolation never reports a latency that was not seen"""
+    histogram = Histogram(LATENCY_BUCKETS)
+    histogram.observe(0.053)
+    assert histogram.summary(scale=1000) == {"mean": 53.0, "p50": 53.0, "p95": 53.0, "p99": 53.0}
+
+    for i in range(100):
+        histogram.observe(0.1 + i / 1000)
+    assert 0.1 <= histogram.quantile(0.5) <= histogram.quantile(0.95) <= 0.2
+
+
+def test_registry_snapshot_and_prometheus():
+    """Calls, errors and payload sizes show up in both the snapshot and the text format"""
+    registry = MetricsRegistry()
+    for error in (False, False, True):
+        started = registry.start(registry.tools, "yfinance_data")
+        registry.finish(registry.tools, "yfinance_data", started, error=error, size=200)
+
+    stats = registry.snapshot()["tools"]["yfinance_data"]
+    assert stats["calls"] == 3
+    assert stats["errors"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["response_bytes"]["p50"] == 200
+
+    text = registry.prometheus()
+    assert 'mcp_tool_calls_total{tool="yfinance_data"} 3' in text
+    assert 'mcp_tool_latency_seconds_count{tool="yfinance_data"} 3' in text
+    assert 'mcp_tool_latency_seconds_bucket{tool="yfinance_data",le="+Inf"} 3' in text
+    assert "# TYPE mcp_attempt_pool_abandoned_total counter" in text
+    assert isinstance(registry.snapshot()["attempt_pools"], dict)
+
+
+def test_prometheus_families_are_contiguous():
+    """Each metric family is one block under its TYPE line, however many tools report it"""
+    registry = MetricsRegistry()
+    for name in ("roll_dice", "web_search"):
+        started = registry.start(registry.tools, name)
+        registry.finish(registry.tools, name, started, size=100)
+        started = registry.start(registry.upstreams, name)
+        registry.finish(registry.upstreams, name, started)
+
+    families = []
+    for line in registry.prometheus().splitlines():
+        if line.startswith("# TYPE "):
+            metric, kind = line.split()[2:]
+            families.append(metric)
+            continue
+        sample = line.split("{")[0]
+        family = families[-1]
+        if kind == "histogram":
+            assert sample in (f"{family}_bucket", f"{family}_sum", f"{family}_count"), line
+        else:
+            assert sample == family, line
+
+    assert len(families) == len(set(families))
+    assert "mcp_tool_calls_total" in families and "mcp_upstream_in_flight" in families
+
+
+if __name__ == "__main__":
+    test_histogram_quantiles_stay_in_observed_range()
+    test_registry_snapshot_and_prometheus()
+    test_prometheus_families_are_contiguous()
+    print("✅ Metrics tests passed")
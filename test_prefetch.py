@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for the speculative tool prefetch
+"""
+
+import time
+from prefetch import ToolPrefetcher
+from deadlines import current_deadline, deadline_scope
+
+
+def slow_stock(symbol: str) -> str:
+    time.sleep(0.2)
+    return f"Stock: {symbol}"
+
+
+def test_detect_intents():
+    """Dice notation and ticker symbols are picked up, common words are not"""
+    prefetcher = ToolPrefetcher({"roll_dice": lambda n, r=1: n, "yfinance_data": slow_stock})
+
+    assert prefetcher.detect("Roll 3d6 for my character's strength") == [("roll_dice", ("3d6", 1))]
+    assert prefetcher.detect("What's the current stock price of AAPL?") == [("yfinance_data", ("AAPL",))]
+    assert prefetcher.detect("How is $tsla doing?") == [("yfinance_data", ("TSLA",))]
+    assert prefetcher.detect("Search for news about AI and the USA") == []
+
+
+def test_prefetched_result_is_reused():
+    """A prefetched call is handed to the tool instead of running twice"""
+    calls = []
+
+    def stock(symbol):
+        calls.append(symbol)
+        return slow_stock(symbol)
+
+    prefetcher = ToolPrefetcher({"yfinance_data": stock})
+    keys = prefetcher.start("Get the stock price for MSFT")
+
+    assert prefetcher.call("yfinance_data", "MSFT") == "Stock: MSFT"
+    assert calls == ["MSFT"]
+
+    # Once the turn is done the call is dropped, and a second call runs live
+    prefetcher.discard(keys)
+    assert prefetcher.call("yfinance_data", "MSFT") == "Stock: MSFT"
+    assert calls == ["MSFT", "MSFT"]
+
+
+def test_turns_sharing_a_prefetch_keep_it_until_both_are_done():
+    """A turn finishing first does not drop the call another turn is still counting on"""
+    calls = []
+
+    def stock(symbol):
+        calls.append(symbol)
+        return slow_stock(symbol)
+
+    prefetcher = ToolPrefetcher({"yfinance_data": stock})
+    first = prefetcher.start("Get the stock price for MSFT")
+    second = prefetcher.start("Is MSFT stock up today?")
+
+    assert prefetcher.call("yfinance_data", "MSFT") == "Stock: MSFT"
+    prefetcher.discard(first)
+    assert prefetcher.call("yfinance_data", "MSFT") == "Stock: MSFT"
+    assert calls == ["MSFT"]
+
+    # Used by both turns, so the next turn starts a fresh call, and the old keys release nothing
+    third = prefetcher.start("MSFT stock price again")
+    prefetcher.discard(second)
+    assert prefetcher.call("yfinance_data", "MSFT") == "Stock: MSFT"
+    assert calls == ["MSFT", "MSFT"]
+    prefetcher.discard(third)
+
+
+def test_prefetched_call_sees_the_turn_deadline():
+    """The prefetch runs under the deadline of the turn that started it"""
+    prefetcher = ToolPrefetcher({"yfinance_data": lambda symbol: current_deadline()})
+    with deadline_scope(5) as deadline:
+        prefetcher.start("Get the stock price for MSFT")
+        assert prefetcher.call("yfinance_data", "MSFT") is deadline
+
+
+if __name__ == "__main__":
+    test_detect_intents()
+    test_prefetched_result_is_reused()
+    test_turns_sharing_a_prefetch_keep_it_until_both_are_done()
+    test_prefetched_call_sees_the_turn_deadline()
+    print("✅ Prefetch tests passed")
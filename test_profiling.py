@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the tool profiling hooks
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+import threading
+from profiling import ToolProfiler
+from deadlines import call_with_deadline
+
+
+def slow_lookup():
+    time.sleep(0.05)
+    return [str(i) for i in range(10000)]
+
+
+def test_sampled_call_writes_stacks_and_memory():
+    """A profiled call leaves collapsed stacks and allocation sites for its tool"""
+    output_dir = tempfile.mkdtemp()
+    profiler = ToolProfiler(enabled=True, sample_rate=1.0, memory=True, interval=0.005, output_dir=output_dir)
+    with profiler.profile("yfinance_data"):
+        # Still referenced when the snapshot is taken, so it counts as allocated by the call
+        result = slow_lookup()
+    assert len(result) == 10000
+
+    with open(os.path.join(output_dir, "yfinance_data.collapsed")) as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+    assert any("slow_lookup (test_profiling.py" in line for line in lines)
+
+    with open(os.path.join(output_dir, "yfinance_data.memory.txt")) as f:
+        assert "test_profiling.py" in f.read()
+    assert profiler.settings()["profiled"] == {"yfinance_data": 1}
+
+
+def busy_elsewhere(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_only_threads_working_on_the_call_are_sampled():
+    """Deadline workers of the call are sampled, unrelated threads and the idle event loop are not"""
+    output_dir = tempfile.mkdtemp()
+    profiler = ToolProfiler(enabled=True, sample_rate=1.0, interval=0.005, output_dir=output_dir)
+    stop = threading.Event()
+    other = threading.Thread(target=busy_elsewhere, args=(stop,), name="other-session")
+    other.start()
+    try:
+        with profiler.profile("web_search"):
+            call_with_deadline(slow_lookup)
+
+        async def tool():
+            with profiler.profile("yfinance_data"):
+                await asyncio.sleep(0.05)
+                slow_lookup()
+
+        asyncio.run(tool())
+    finally:
+        stop.set()
+        other.join()
+
+    with open(os.path.join(output_dir, "web_search.collapsed")) as f:
+        lines = f.read()
+    assert "slow_lookup (test_profiling.py" in lines
+    assert "\ndeadline_" in "\n" + lines
+    assert "busy_elsewhere" not in lines and "tool-profiler" not in lines
+
+    with open(os.path.join(output_dir, "yfinance_data.collapsed")) as f:
+        lines = f.read()
+    assert "slow_lookup (test_profiling.py" in lines
+    # While the coroutine is suspended the loop waits in its selector, which is left out
+    assert "select" not in lines and "busy_elsewhere" not in lines
+
+
+def test_disabled_and_unsampled_calls_are_not_profiled():
+    """Nothing is written when profiling is off or the call is not sampled"""
+    output_dir = tempfile.mkdtemp()
+    profiler = ToolProfiler(enabled=False, sample_rate=1.0, output_dir=output_dir)
+    with profiler.profile("roll_dice"):
+        slow_lookup()
+
+    profiler.configure(enabled=True, sample_rate=0.0)
+    with profiler.profile("roll_dice"):
+        slow_lookup()
+
+    assert os.listdir(output_dir) == []
+    assert profiler.settings()["profiled"] == {}
+
+    try:
+        profiler.configure(sample_rate=2)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_sampled_call_writes_stacks_and_memory()
+    test_only_threads_working_on_the_call_are_sampled()
+    test_disabled_and_unsampled_calls_are_not_profiled()
+    print("✅ Profiling tests passed")
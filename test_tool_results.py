@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test script for the structured tool results
+"""
+
+import json
+from tool_results import stock_quote, dice_rolls, search_results, select, encode, render
+
+
+def test_stock_quote_is_typed_and_selectable():
+    """Yahoo info becomes typed fields, and callers can ask for just a few of them"""
+    info = {
+        "currentPrice": 190.5,
+        "regularMarketPrice": 190.4,
+        "previousClose": 188.0,
+        "regularMarketChange": 2.5,
+        "regularMarketChangePercent": 1.33,
+        "volume": 1000,
+        "trailingPE": "Infinity",
+    }
+    quote = stock_quote("AAPL", info)
+    assert quote == {"symbol": "AAPL", "price": 190.5, "previous_close": 188.0, "change": 2.5,
+                     "change_pct": 1.33, "volume": 1000}
+
+    assert select(quote, "price,change_pct") == {"symbol": "AAPL", "price": 190.5, "change_pct": 1.33}
+    assert select(quote, ["text"]) == {"symbol": "AAPL", "text": "AAPL $190.5 (+2.50, +1.33%)"}
+    assert select(quote, "") is quote
+
+    assert encode(select(quote, "price")) == '{"symbol":"AAPL","price":190.5}'
+
+
+def test_dice_and_search_payloads():
+    """Dice rolls and search context keep their structure instead of being formatted as prose"""
+    rolls = dice_rolls("4d6k3", [{"rolls": [6, 5, 3, 1], "kept": [6, 5, 3], "total": 14}])
+    assert rolls == {"notation": "4d6k3", "rolls": [[6, 5, 3, 1]], "kept": [[6, 5, 3]], "totals": [14]}
+    assert select(rolls, "totals") == {"notation": "4d6k3", "totals": [14]}
+    assert render(rolls) == "4d6k3: 14"
+
+    context = json.dumps([{"url": "https://example.com", "content": "MCP is a protocol"}])
+    results = search_results("MCP", context)
+    assert results["results"] == [{"url": "https://example.com", "content": "MCP is a protocol"}]
+    assert render(results) == "1 results for 'MCP'"
+
+
+if __name__ == "__main__":
+    test_stock_quote_is_typed_and_selectable()
+    test_dice_and_search_payloads()
+    print("✅ Tool result tests passed")
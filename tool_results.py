@@ -0,0 +1,107 @@
+"""
+Structured Tool Results
+Compact typed payloads for the tool results, shared by server.py and mcp_tools.py. Callers can
+ask for a subset of the fields, and for a short text rendering by including `text` in the fields.
+"""
+
+import json
+
+# Payload field -> Yahoo Finance info keys, the first one present wins
+STOCK_FIELDS = {
+    "price": ("currentPrice", "regularMarketPrice"),
+    "previous_close": ("previousClose",),
+    "change": ("regularMarketChange",),
+    "change_pct": ("regularMarketChangePercent",),
+    "volume": ("volume",),
+    "market_cap": ("marketCap",),
+    "pe_ratio": ("trailingPE",),
+    "dividend_yield": ("dividendYield",),
+    "high_52w": ("fiftyTwoWeekHigh",),
+    "low_52w": ("fiftyTwoWeekLow",),
+}
+
+
+def _number(value):
+    # yfinance sometimes reports 'Infinity' or other strings where a number is expected
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    return value
+
+
+def stock_quote(symbol: str, info: dict) -> dict:
+    """Typed quote from Yahoo Finance info, fields with no value are left out"""
+    quote = {"symbol": symbol}
+    for field, keys in STOCK_FIELDS.items():
+        for key in keys:
+            value = _number(info.get(key))
+            if value is not None:
+                quote[field] = value
+                break
+    return quote
+
+
+def dice_rolls(notation: str, results: list) -> dict:
+    """Rolls, kept dice and total of each roll from DiceRoller.roll_multiple"""
+    return {
+        "notation": notation,
+        "rolls": [result["rolls"] for result in results],
+        "kept": [result["kept"] for result in results],
+        "totals": [result["total"] for result in results],
+    }
+
+
+def search_results(query: str, context) -> dict:
+    """Sources from Tavily's search context, which is a JSON string of url/content pairs"""
+    try:
+        sources = json.loads(context) if isinstance(context, str) else context
+    except ValueError:
+        sources = [{"url": None, "content": context}]
+    return {"query": query, "results": [{"url": s.get("url"), "content": s.get("content")} for s in sources]}
+
+
+def error(message: str, **fields) -> dict:
+    return {**fields, "error": message}
+
+
+def render(payload: dict) -> str:
+    """One-line text rendering of a payload"""
+    if "error" in payload:
+        return payload["error"]
+    if "totals" in payload:
+        totals = ", ".join(map(str, payload["totals"]))
+        return f"{payload['notation']}: {totals}"
+    if "results" in payload:
+        return f"{len(payload['results'])} results for {payload['query']!r}"
+    text = f"{payload['symbol']} ${payload.get('price', 'N/A')}"
+    if "change" in payload and "change_pct" in payload:
+        text += f" ({payload['change']:+.2f}, {payload['change_pct']:+.2f}%)"
+    return text
+
+
+def parse_fields(fields) -> list:
+    """Accept 'price,change_pct' or a list of field names, empty means every field"""
+    if not fields:
+        return []
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    return [field.strip() for field in fields if field.strip()]
+
+
+def select(payload: dict, fields=None) -> dict:
+    """Keep only the requested fields, `text` adds the short rendering
+
+    Identifying fields (symbol, notation, query) and errors are always kept.
+    """
+    fields = parse_fields(fields)
+    if not fields:
+        return payload
+    keep = set(fields) | {"symbol", "notation", "query", "error"}
+    selected = {key: value for key, value in payload.items() if key in keep}
+    if "text" in keep:
+        selected["text"] = render(payload)
+    return selected
+
+
+def encode(payload: dict) -> str:
+    """Minimal JSON, the MCP version in use has no structured content so this is the text content"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)